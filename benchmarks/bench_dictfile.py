@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Compare parsing memory.stat with the original DictFile parser, the current one, and the current one reading only
+some keys (rss and cache by default) from str and from bytes.
+
+    python benchmarks/bench_dictfile.py
+    python benchmarks/bench_dictfile.py --keys total_rss total_cache
+    python benchmarks/bench_dictfile.py --file /sys/fs/cgroup/memory/memory.stat
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cgroupspy.interfaces import DictFile  # noqa: E402
+
+# memory.stat of a cgroup v1 memory controller, as of Linux 5.x
+MEMORY_STAT = b"""cache 70209536
+rss 2895872
+rss_huge 0
+shmem 9711616
+mapped_file 6963200
+dirty 49152
+writeback 0
+workingset_refault_anon 0
+workingset_refault_file 0
+swap 0
+swapcached 0
+pgpgin 32371
+pgpgout 17979
+pgfault 30600
+pgmajfault 1
+inactive_anon 2748416
+active_anon 0
+inactive_file 38903808
+active_file 21594112
+unevictable 9859072
+hierarchical_memory_limit 9223372036854771712
+hierarchical_memsw_limit 9223372036854771712
+total_cache 1151807488
+total_rss 192602112
+total_rss_huge 0
+total_shmem 9711616
+total_mapped_file 146698240
+total_dirty 1777664
+total_writeback 0
+total_workingset_refault_anon 0
+total_workingset_refault_file 0
+total_swap 0
+total_swapcached 0
+total_pgpgin 3305477
+total_pgpgout 3013752
+total_pgfault 4370240
+total_pgmajfault 314
+total_inactive_anon 192368640
+total_active_anon 32768
+total_inactive_file 607604736
+total_active_file 534491136
+total_unevictable 9859072
+"""
+
+
+def original_sanitize_get(value):
+    res = {}
+    for el in value.split("\n"):
+        key, val = el.split()
+        res[key] = int(val)
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="parse this file instead of the built-in memory.stat")
+    parser.add_argument("--keys", nargs="+", default=["rss", "cache"], help="the keys to read")
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    raw = MEMORY_STAT
+    if args.file:
+        with open(args.file, "rb") as f:
+            raw = f.read()
+    content = raw.decode().strip()
+    interface = DictFile("memory.stat")
+    keys = args.keys
+
+    cases = [
+        ("original", lambda: original_sanitize_get(content)),
+        ("all keys, str", lambda: interface.sanitize_get(content)),
+        ("keys, str", lambda: interface.sanitize_get(content, keys)),
+        ("keys, bytes", lambda: interface.sanitize_get(raw, keys)),
+        ("decode + keys, str", lambda: interface.sanitize_get(raw.decode().strip(), keys)),
+    ]
+    print("{} lines, keys {}, {} parses".format(len(content.splitlines()), " ".join(keys), args.number))
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=args.number, repeat=5))
+        print("{:<20} {:>8.2f} us/parse".format(name, best * 1e6 / args.number))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Compare reading memory.usage_in_bytes, cpuacct.usage and cpu.stat for many cgroups by opening the files on every
+read and through a FileDescriptorCache.
+
+    python benchmarks/bench_fd_cache.py --cgroups 5000
+    python benchmarks/bench_fd_cache.py --root /sys/fs/cgroup
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cgroupspy.fileio import FileDescriptorCache  # noqa: E402
+from cgroupspy.trees import Tree  # noqa: E402
+
+FILES = {
+    b"memory": (b"memory.usage_in_bytes", b"1167785984\n"),
+    b"cpuacct": (b"cpuacct.usage", b"9170713528913\n"),
+    b"cpu": (b"cpu.stat", b"nr_periods 0\nnr_throttled 0\nthrottled_time 0\n"),
+}
+READS = {b"memory": "usage_in_bytes", b"cpuacct": "usage", b"cpu": "stat"}
+
+
+def make_hierarchy(root, cgroups):
+    for controller, (filename, content) in FILES.items():
+        for i in range(cgroups):
+            path = os.path.join(root, controller, b"machine.slice", b"vm-%d.scope" % i)
+            os.makedirs(path)
+            with open(os.path.join(path, filename), "wb") as f:
+                f.write(content)
+
+
+def sweep(controllers):
+    for controller, key in controllers:
+        getattr(controller, key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cgroups", type=int, default=5000, help="cgroups per controller in the synthetic tree")
+    parser.add_argument("--root", help="read an existing cgroup v1 mount instead of a synthetic tree")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    root = args.root.encode() if args.root else tempfile.mkdtemp().encode()
+    try:
+        if not args.root:
+            make_hierarchy(root, args.cgroups)
+
+        tree = Tree(root_path=root, groups=list(FILES))
+        controllers = [(node.controller, READS[node.controller_type]) for node in tree.walk()
+                       if node.controller_type in READS and
+                       os.path.exists(node.controller.filepath(FILES[node.controller_type][0]))]
+        print("{} reads per sweep".format(len(controllers)))
+
+        best = min(timeit.repeat(lambda: sweep(controllers), number=1, repeat=args.repeat))
+        print("{:<24} {:>8.1f} ms {:>6.2f} us/read".format("open/read/close", best * 1e3, best * 1e6 / len(controllers)))
+
+        fd_cache = FileDescriptorCache(maxsize=len(controllers))
+        for controller, _ in controllers:
+            controller.fd_cache = fd_cache
+        sweep(controllers)
+        best = min(timeit.repeat(lambda: sweep(controllers), number=1, repeat=args.repeat))
+        print("{:<24} {:>8.1f} ms {:>6.2f} us/read".format("FileDescriptorCache", best * 1e3, best * 1e6 / len(controllers)))
+        fd_cache.clear()
+    finally:
+        if not args.root:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Measure the per-node memory and the cost of the path properties on a synthetic in-memory tree.
+
+    python benchmarks/bench_nodes.py --nodes 100000
+"""
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cgroupspy.nodes import Node, NodeControlGroup  # noqa: E402
+
+
+def build(count):
+    """A cpu hierarchy of machine.slice/vm-N.scope/vcpuM nodes, built without touching the filesystem"""
+    root = Node(b"/sys/fs/cgroup")
+    cpu = root.add_child(Node(b"cpu", parent=root))
+    machine = cpu.add_child(Node(b"machine.slice", parent=cpu))
+    nodes = [root, cpu, machine]
+    vms = count // 5
+    for i in range(vms):
+        vm = machine.add_child(Node(b"vm-%d.scope" % i, parent=machine))
+        nodes.append(vm)
+        for j in range(4):
+            nodes.append(vm.add_child(Node(b"vcpu%d" % j, parent=vm)))
+    return nodes
+
+
+def build_groups(nodes):
+    """One group per node below the controller root, mirroring the node hierarchy"""
+    control_root = NodeControlGroup(b"cgroup")
+    control_root.add_node(nodes[1])
+    groups = {id(nodes[1]): control_root}
+    for node in nodes[2:]:
+        group = NodeControlGroup(node.name, parent=groups[id(node.parent)])
+        group.add_node(node)
+        groups[id(node)] = group
+    return list(groups.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=100000)
+    parser.add_argument("--number", type=int, default=200000)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    nodes = build(args.nodes)
+    after = tracemalloc.get_traced_memory()[0]
+    groups = build_groups(nodes)
+    after_groups = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print("{} nodes".format(len(nodes)))
+    print("{:<34} {:>8.0f} bytes".format("memory per Node (with controller)", float(after - before) / len(nodes)))
+    print("{:<34} {:>8.0f} bytes".format("memory per NodeControlGroup", float(after_groups - after) / len(groups)))
+
+    leaf = nodes[-1]
+    vm = leaf.parent
+    ctrl = leaf.controller
+    group = groups[-1]
+    cases = [
+        ("Node.full_path", lambda: leaf.full_path),
+        ("Node.path", lambda: leaf.path),
+        ("Controller.filepath", lambda: ctrl.filepath(b"cpu.shares")),
+        ("Node.__eq__", lambda: leaf == vm.children[0]),
+        ("NodeControlGroup.path", lambda: group.path),
+        ("NodeControlGroup controller attr", lambda: group.cpu),
+    ]
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=args.number, repeat=3))
+        print("{:<34} {:>8.0f} ns".format(name, best / args.number * 1e9))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Compare reading single cgroup files through a text file object (open, decode, strip, parse) with the readinto()
+path that parses the bytes directly.
+
+    python benchmarks/bench_reads.py
+    python benchmarks/bench_reads.py --root /sys/fs/cgroup
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cgroupspy.fileio import read_file  # noqa: E402
+from cgroupspy.interfaces import IntegerFile, DictFile, MultiLineIntegerFile  # noqa: E402
+
+FILES = [
+    (b"memory/memory.usage_in_bytes", IntegerFile("memory.usage_in_bytes"), b"1167785984\n"),
+    (b"cpu/cpu.stat", DictFile("cpu.stat"), b"nr_periods 0\nnr_throttled 0\nthrottled_time 0\n"),
+    (b"cpu/tasks", MultiLineIntegerFile("tasks"), b"".join(b"%d\n" % pid for pid in range(1000, 1064))),
+]
+
+
+def text_read(path, interface):
+    with open(path) as f:
+        return interface.sanitize_get(f.read().strip())
+
+
+def bytes_read(path, interface):
+    return interface.sanitize_get_bytes(read_file(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", help="read an existing cgroup v1 mount instead of synthetic files")
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    root = args.root.encode() if args.root else tempfile.mkdtemp().encode()
+    try:
+        if not args.root:
+            for filename, _, content in FILES:
+                path = os.path.join(root, filename)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path, "wb") as f:
+                    f.write(content)
+
+        for filename, interface, _ in FILES:
+            path = os.path.join(root, filename)
+            if not os.path.exists(path):
+                continue
+            assert text_read(path, interface) == bytes_read(path, interface)
+            for name, func in [("text", text_read), ("readinto", bytes_read)]:
+                best = min(timeit.repeat(lambda: func(path, interface), number=args.number, repeat=5))
+                print("{:<30} {:<10} {:>6.2f} us/read".format(filename.decode(), name, best * 1e6 / args.number))
+    finally:
+        if not args.root:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
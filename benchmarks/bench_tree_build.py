@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Compare building Tree() and GroupedTree() with the scandir based builder against the previous listdir + isdir one,
+and loading a VMTree from a snapshot, on a synthetic cgroup v1 hierarchy.
+
+    python benchmarks/bench_tree_build.py --scopes 2000 --files 25
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cgroupspy import trees  # noqa: E402
+
+CONTROLLERS = [b"blkio", b"cpu", b"cpuacct", b"cpuset", b"devices", b"memory", b"net_cls", b"net_prio"]
+
+
+def make_hierarchy(root, scopes, files):
+    filenames = [b"control.%d" % i for i in range(files)]
+    for controller in CONTROLLERS:
+        for i in range(scopes):
+            path = os.path.join(root, controller, b"machine.slice", b"vm-%d.scope" % i)
+            os.makedirs(path)
+            for filename in filenames:
+                open(os.path.join(path, filename), "w").close()
+
+
+class LegacyBuilder(object):
+    def get_children_paths(self, parent_full_path):
+        for dir_name in os.listdir(parent_full_path):
+            if os.path.isdir(os.path.join(parent_full_path, dir_name)):
+                yield dir_name
+
+
+class LegacyTree(LegacyBuilder, trees.Tree):
+    pass
+
+
+class LegacyBaseTree(LegacyBuilder, trees.BaseTree):
+    pass
+
+
+def count_stats(func):
+    """Count the stat calls made from python while running func"""
+    calls = [0]
+    original = os.stat
+
+    def counting_stat(*args, **kwargs):
+        calls[0] += 1
+        return original(*args, **kwargs)
+
+    os.stat = counting_stat
+    try:
+        func()
+    finally:
+        os.stat = original
+    return calls[0]
+
+
+def grouped(root, base_tree_class):
+    original = trees.BaseTree
+    trees.BaseTree = base_tree_class
+    try:
+        return trees.GroupedTree(root_path=root)
+    finally:
+        trees.BaseTree = original
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scopes", type=int, default=2000, help="scopes per controller")
+    parser.add_argument("--files", type=int, default=25, help="control files per scope")
+    parser.add_argument("--workers", type=int, default=len(CONTROLLERS), help="threads for the parallel build")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp().encode()
+    try:
+        make_hierarchy(root, args.scopes, args.files)
+        snapshot = os.path.join(root, b"snapshot")
+        trees.VMTree(root_path=root).save(snapshot)
+        cases = [
+            ("Tree, listdir + isdir", lambda: LegacyTree(root_path=root)),
+            ("Tree, scandir", lambda: trees.Tree(root_path=root)),
+            ("Tree, scandir, workers", lambda: trees.Tree(root_path=root, workers=args.workers)),
+            ("GroupedTree, listdir + isdir", lambda: grouped(root, LegacyBaseTree)),
+            ("GroupedTree, scandir", lambda: trees.GroupedTree(root_path=root)),
+            ("GroupedTree, scandir, workers", lambda: trees.GroupedTree(root_path=root, workers=args.workers)),
+            ("VMTree", lambda: trees.VMTree(root_path=root)),
+            ("VMTree.load, refreshed", lambda: trees.VMTree.load(snapshot)),
+            ("VMTree.load, not refreshed", lambda: trees.VMTree.load(snapshot, refresh=False)),
+        ]
+        print("{} controllers x {} scopes x {} files".format(len(CONTROLLERS), args.scopes, args.files))
+        for name, func in cases:
+            best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+            print("{:<30} {:>8.1f} ms {:>10} stat calls".format(name, best * 1000, count_stats(func)))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+asyncio access to cgroups (Python 3 only). The cgroupfs reads and writes block, so they run in a bounded thread pool
+and the event loop only awaits them.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import walk_tree, get_node_controller
+
+
+class AsyncExecutor(object):
+
+    """
+    Runs the blocking controller and node calls in a pool of at most max_workers threads.
+
+    >>> executor = AsyncExecutor(max_workers=8)
+    >>> await executor.set_content(group.memory, "limit_in_bytes", 2 ** 30)
+    >>> async for group, values in executor.walk(tree.control_root, "memory", ["usage_in_bytes"]):
+    ...     print(group.path, values["usage_in_bytes"])
+    """
+
+    def __init__(self, max_workers=8):
+        """
+        :param max_workers: int -> The number of threads, which is also the number of cgroupfs calls in flight
+        """
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Creating and deleting cgroups changes the tree, so only one thread does it at a time
+        self._tree_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def run(self, func, *args, **kwargs):
+        """Run a blocking call in the pool. Returns an awaitable with its result"""
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def get_property(self, controller, filename):
+        """See Controller.get_property"""
+        return await self.run(controller.get_property, filename)
+
+    async def set_property(self, controller, filename, value):
+        """See Controller.set_property"""
+        return await self.run(controller.set_property, filename, value)
+
+    async def get_content(self, controller, key):
+        """See Controller.get_content"""
+        return await self.run(controller.get_content, key)
+
+    async def set_content(self, controller, key, value):
+        """
+        Write an interface by name, the same as controller.<key> = value
+        """
+        if controller.get_interface(key) is None:
+            raise AttributeError("{} has no interface {}".format(controller.__class__.__name__, key))
+        return await self.run(setattr, controller, key, value)
+
+    async def snapshot(self, controller, keys=None):
+        """See Controller.snapshot"""
+        return await self.run(controller.snapshot, keys)
+
+    async def create_cgroup(self, node, name):
+        """See Node.create_cgroup"""
+        return await self.run(self._locked, node.create_cgroup, name)
+
+    async def delete_cgroup(self, node, name):
+        """See Node.delete_cgroup"""
+        return await self.run(self._locked, node.delete_cgroup, name)
+
+    def _locked(self, func, *args):
+        with self._tree_lock:
+            return func(*args)
+
+    async def walk(self, root, controller, keys=None, prune=None, max_depth=None):
+        """
+        Walk the nodes below root, reading the interfaces of one controller type from each of them in the pool.
+        Yields (node, values) pairs in the order the reads finish. Nodes without the controller are skipped.
+
+        The walk itself runs on the loop, so lazy nodes should be loaded before, e.g. with GroupedTree.load_all().
+
+        :param root: Node | NodeControlGroup -> Where to start, e.g. tree.root or tree.control_root
+        :param controller: str -> Controller type, e.g. "memory"
+        :param keys: None | list -> Interface names, see Controller.snapshot
+        :param prune: See utils.walk_tree
+        :param max_depth: See utils.walk_tree
+        """
+        if not isinstance(controller, bytes):
+            controller = controller.encode()
+
+        def read(node, ctl):
+            return node, ctl.snapshot(keys)
+
+        # Keep twice as many reads queued as there are threads, so the pool never idles and the queue stays short
+        window = self.max_workers * 2
+        pending = set()
+        try:
+            for node in walk_tree(root, prune=prune, max_depth=max_depth):
+                ctl = get_node_controller(node, controller)
+                if ctl is None:
+                    continue
+
+                pending.add(self.run(read, node, ctl))
+                if len(pending) >= window:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,131 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import threading
+
+from .utils import monotonic
+
+
+class ReadCache(object):
+
+    """
+    Keeps the content of cgroup files read through the controller interfaces for a short while, so that values read
+    over and over within the TTL come from memory instead of cgroupfs. Writes through the controllers drop the entry
+    of the file they write to. Volatile interfaces (counters and statistics) are never cached.
+
+    >>> cache = ReadCache(ttl=5, ttls={IntegerFile: 1})
+    >>> controller.read_cache = cache
+    >>> controller.limit_in_bytes  # read from cgroupfs
+    >>> controller.limit_in_bytes  # from the cache, for up to a second
+    >>> cache.stats()
+    {'hits': 1, 'misses': 1, 'size': 1}
+    """
+
+    def __init__(self, ttl=1.0, ttls=None, volatile_ttl=0, maxsize=65536):
+        """
+        :param ttl: float -> Seconds the content of an interface is kept, unless ttls says otherwise
+        :param ttls: None | dict -> Seconds by interface type, e.g. {CommaDashSetFile: 10}. Subclasses of a type get
+                                    its TTL. A TTL of 0 disables caching for the type.
+        :param volatile_ttl: float -> Seconds the content of volatile interfaces is kept. 0, by default, disables it.
+        :param maxsize: int -> The number of files after which expired entries are dropped
+        """
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.volatile_ttl = volatile_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        # Bumped by every invalidation, so that a read racing with a write does not cache the old content
+        self._generation = 0
+        self._interface_ttls = {}
+        self._lock = threading.Lock()
+
+    def get_ttl(self, interface):
+        """The TTL of an interface instance, worked out once per interface"""
+        ttl = self._interface_ttls.get(interface)
+        if ttl is None:
+            if interface.volatile:
+                ttl = self.volatile_ttl
+            else:
+                ttl = self.ttl
+                for klass in type(interface).__mro__:
+                    if klass in self.ttls:
+                        ttl = self.ttls[klass]
+                        break
+            self._interface_ttls[interface] = ttl
+        return ttl
+
+    def get(self, controller, interface):
+        """
+        The raw content of an interface's file, from the cache while it is fresh, otherwise read from the controller.
+        """
+        ttl = self.get_ttl(interface)
+        if ttl <= 0:
+            return controller.get_raw_property(interface.filename)
+
+        path = controller.filepath(interface.filename)
+        now = monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        content = controller.get_raw_property(interface.filename)
+        with self._lock:
+            if generation == self._generation:
+                if len(self._entries) >= self.maxsize:
+                    self._drop_expired(now)
+                self._entries[path] = (now + ttl, content)
+        return content
+
+    def _drop_expired(self, now):
+        expired = [path for path, entry in self._entries.items() if entry[0] <= now]
+        for path in expired:
+            del self._entries[path]
+        if len(self._entries) >= self.maxsize:
+            self._entries.clear()
+
+    def invalidate(self, path):
+        """Drop the cached content of a file"""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(path, None)
+
+    def clear(self):
+        """Drop all the cached content and reset the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Hits, misses and the number of cached files"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
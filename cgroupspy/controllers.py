@@ -29,7 +29,15 @@ import errno
 from cgroupspy.contenttypes import DeviceAccess, DeviceThrottle
 
 from .interfaces import BaseFileInterface, FlagFile, BitFieldFile, IntegerFile, SplitValueFile, DictOrFlagFile
-from .interfaces import MultiLineIntegerFile, CommaDashSetFile, DictFile, IntegerListFile, TypedFile
+from .fileio import read_file
+from .interfaces import MultiLineIntegerFile, CommaDashSetFile, DictFile, IntegerListFile, TypedFile, BlkIOStatsFile
+
+# Errors that make a file count as missing when reading:
+#  ENOENT - does not exist
+#  EACCES - cannot be read
+#  EINVAL - invalid argument
+#  ENODEV - the cgroup was removed while its file was open
+UNREADABLE_ERRNOS = frozenset([errno.ENOENT, errno.EACCES, errno.EINVAL, errno.ENODEV])
 
 
 class Controller(object):
@@ -38,49 +46,124 @@ class Controller(object):
     Base controller. Provides access to general files, existing in all cgroups and means to get/set properties
     """
 
-    tasks = MultiLineIntegerFile("tasks")
-    procs = MultiLineIntegerFile("cgroup.procs")
+    tasks = MultiLineIntegerFile("tasks", volatile=True)
+    procs = MultiLineIntegerFile("cgroup.procs", volatile=True)
     notify_on_release = FlagFile("notify_on_release")
     clone_children = FlagFile("cgroup.clone_children")
 
+    # A fileio.FileDescriptorCache used by the controllers that have none of their own, when set
+    default_fd_cache = None
+    # A cache.ReadCache used by the controllers that have none of their own, when set
+    default_read_cache = None
+
+    # Per controller class: the file interfaces by attribute name, and the ones that can be read
+    _interface_maps = {}
+    _read_plans = {}
+
+    __slots__ = ("node", "_fd_cache", "_read_cache", "__weakref__")
+
     def __init__(self, node):
         self.node = node
+        self._fd_cache = None
+        self._read_cache = None
+
+    @property
+    def fd_cache(self):
+        """
+        The FileDescriptorCache that keeps the controller's files open between reads, or None to open the files on
+        every read. Falls back to the class-wide default_fd_cache.
+        """
+        if self._fd_cache is not None:
+            return self._fd_cache
+        return self.default_fd_cache
+
+    @fd_cache.setter
+    def fd_cache(self, fd_cache):
+        self._fd_cache = fd_cache
+
+    @property
+    def read_cache(self):
+        """
+        The ReadCache that interface reads go through, or None to always read from cgroupfs. Falls back to the
+        class-wide default_read_cache.
+        """
+        if self._read_cache is not None:
+            return self._read_cache
+        return self.default_read_cache
+
+    @read_cache.setter
+    def read_cache(self, read_cache):
+        self._read_cache = read_cache
 
     def filepath(self, filename):
         """The full path to a file"""
 
         return os.path.join(self.node.full_path, filename)
 
+    @classmethod
+    def _interface_map(cls):
+        """The file interfaces of the class and its bases by attribute name, collected once per class"""
+        interfaces = Controller._interface_maps.get(cls)
+        if interfaces is None:
+            interfaces = {}
+            for klass in reversed(cls.__mro__):
+                for key, value in vars(klass).items():
+                    if isinstance(value, BaseFileInterface):
+                        interfaces[key] = value
+                    else:
+                        interfaces.pop(key, None)
+            Controller._interface_maps[cls] = interfaces
+        return interfaces
+
+    @classmethod
+    def _read_plan(cls):
+        """The readable file interfaces of the class by attribute name, collected once per class"""
+        plan = Controller._read_plans.get(cls)
+        if plan is None:
+            plan = dict((key, interface) for key, interface in cls._interface_map().items() if not interface.writeonly)
+            Controller._read_plans[cls] = plan
+        return plan
+
     def list_interfaces(self):
-        result = {}
+        return dict(self._interface_map())
 
-        for data in [self.__class__.__dict__, Controller.__dict__]:
-            for k, interface in data.items():
-                if not issubclass(interface.__class__, BaseFileInterface):
-                    continue
+    def get_interface(self, key):
+        return self._interface_map().get(key)
 
-                result[k] = interface
+    def get_property(self, filename):
+        """Opens the file and reads the value"""
 
-        return result
+        return self.get_raw_property(filename).decode().strip()
 
-    def get_interface(self, key):
-        if key in self.__class__.__dict__:
-            interface = self.__class__.__dict__[key]
-        elif key in Controller.__dict__:
-            interface = Controller.__dict__[key]
-        else:
-            return None
+    def get_raw_property(self, filename):
+        """Opens the file and reads the value as bytes, without decoding or stripping it"""
 
-        if not issubclass(interface.__class__, BaseFileInterface):
-            return None
+        fd_cache = self.fd_cache
+        if fd_cache is not None:
+            return fd_cache.read(self.filepath(filename))
 
-        return interface
+        return read_file(self.filepath(filename))
 
-    def get_property(self, filename):
-        """Opens the file and reads the value"""
+    def get_dict(self, key, keys=None):
+        """
+        Read a DictFile interface from the raw bytes, converting only the wanted keys. Returns None if the file is
+        missing or unreadable, as get_content does.
 
-        with open(self.filepath(filename)) as f:
-            return f.read().strip()
+        :param key: str -> Interface name, e.g. "stat"
+        :param keys: None | iterable -> The wanted keys, e.g. ["rss", "cache"], or None for all of them
+        """
+        interface = self.get_interface(key)
+        if not isinstance(interface, DictFile):
+            raise ValueError("{} is not a dict interface".format(key))
+
+        try:
+            content = self.get_raw_property(interface.filename)
+        except IOError as e:
+            if e.errno in UNREADABLE_ERRNOS:
+                return None
+            raise
+
+        return interface.sanitize_get(content, keys)
 
     def get_content(self, key):
         interface = self.get_interface(key)
@@ -89,29 +172,53 @@ class Controller(object):
             return None
 
         try:
-            content = self.get_property(interface.filename)
+            content = self.get_raw_property(interface.filename)
         except IOError as e:
-            if e.errno == errno.ENOENT:
-                # does not exist
-                return None
-            elif e.errno == errno.EACCES:
-                # cannot be read
-                return None
-            elif e.errno == errno.EINVAL:
-                # invalid argument
+            if e.errno in UNREADABLE_ERRNOS:
                 return None
             raise
 
         if not content.strip():
             return ''
 
-        return interface.sanitize_get(content)
+        return interface.sanitize_get_bytes(content)
+
+    def snapshot(self, keys=None):
+        """
+        Read the readable interfaces of the controller, or only the given ones, in one pass. Write-only, unknown and
+        missing or unreadable files are left out.
+
+        :param keys: None | list -> Interface names, as in get_content
+        :return: dict -> Interface name to value, empty files give ''
+        """
+        plan = self._read_plan()
+        if keys is None:
+            items = plan.items()
+        else:
+            items = [(key, plan[key]) for key in keys if key in plan]
+
+        get_raw_property = self.get_raw_property
+        result = {}
+        for key, interface in items:
+            try:
+                content = get_raw_property(interface.filename)
+            except IOError as e:
+                if e.errno in UNREADABLE_ERRNOS:
+                    continue
+                raise
+            result[key] = interface.sanitize_get_bytes(content) if content.strip() else ''
+        return result
 
     def set_property(self, filename, value):
         """Opens the file and writes the value"""
 
-        with open(self.filepath(filename), "w") as f:
-            return f.write(str(value))
+        read_cache = self.read_cache
+        try:
+            with open(self.filepath(filename), "w") as f:
+                return f.write(str(value))
+        finally:
+            if read_cache is not None:
+                read_cache.invalidate(self.filepath(filename))
 
 
 class CpuController(Controller):
@@ -126,12 +233,14 @@ class CpuController(Controller):
     cpu.shares
     cpu.stat
     """
+
+    __slots__ = ()
     cfs_period_us = IntegerFile("cpu.cfs_period_us")
     cfs_quota_us = IntegerFile("cpu.cfs_quota_us")
     rt_period_us = IntegerFile("cpu.rt_period_us")
     rt_runtime_us = IntegerFile("cpu.rt_runtime_us")
     shares = IntegerFile("cpu.shares")
-    stat = DictFile("cpu.stat", readonly=True)
+    stat = DictFile("cpu.stat", readonly=True, volatile=True)
 
 
 class CpuAcctController(Controller):
@@ -141,9 +250,11 @@ class CpuAcctController(Controller):
     cpuacct.usage
     cpuacct.usage_percpu
     """
-    acct_stat = DictFile("cpuacct.stat", readonly=True)
-    usage = IntegerFile("cpuacct.usage")
-    usage_percpu = IntegerListFile("cpuacct.usage_percpu", readonly=True)
+
+    __slots__ = ()
+    acct_stat = DictFile("cpuacct.stat", readonly=True, volatile=True)
+    usage = IntegerFile("cpuacct.usage", volatile=True)
+    usage_percpu = IntegerListFile("cpuacct.usage_percpu", readonly=True, volatile=True)
 
 
 class CpuSetController(Controller):
@@ -165,6 +276,8 @@ class CpuSetController(Controller):
     cpuset.sched_relax_domain_level
     """
 
+    __slots__ = ()
+
     cpus = CommaDashSetFile("cpuset.cpus")
     mems = CommaDashSetFile("cpuset.mems")
 
@@ -172,7 +285,7 @@ class CpuSetController(Controller):
     mem_exclusive = FlagFile("cpuset.mem_exclusive")
     mem_hardwall = FlagFile("cpuset.mem_hardwall")
     memory_migrate = FlagFile("cpuset.memory_migrate")
-    memory_pressure = FlagFile("cpuset.memory_pressure")
+    memory_pressure = FlagFile("cpuset.memory_pressure", volatile=True)
     memory_pressure_enabled = FlagFile("cpuset.memory_pressure_enabled")
     memory_spread_page = FlagFile("cpuset.memory_spread_page")
     memory_spread_slab = FlagFile("cpuset.memory_spread_slab")
@@ -205,24 +318,26 @@ class MemoryController(Controller):
     memory.use_hierarchy
     """
 
-    failcnt = IntegerFile("memory.failcnt")
-    memsw_failcnt = IntegerFile("memory.memsw.failcnt")
+    __slots__ = ()
+
+    failcnt = IntegerFile("memory.failcnt", volatile=True)
+    memsw_failcnt = IntegerFile("memory.memsw.failcnt", volatile=True)
 
     limit_in_bytes = IntegerFile("memory.limit_in_bytes")
     soft_limit_in_bytes = IntegerFile("memory.soft_limit_in_bytes")
-    usage_in_bytes = IntegerFile("memory.usage_in_bytes")
-    max_usage_in_bytes = IntegerFile("memory.max_usage_in_bytes")
+    usage_in_bytes = IntegerFile("memory.usage_in_bytes", volatile=True)
+    max_usage_in_bytes = IntegerFile("memory.max_usage_in_bytes", volatile=True)
 
     memsw_limit_in_bytes = IntegerFile("memory.memsw.limit_in_bytes")
-    memsw_usage_in_bytes = IntegerFile("memory.memsw.usage_in_bytes")
-    memsw_max_usage_in_bytes = IntegerFile("memory.memsw.max_usage_in_bytes")
+    memsw_usage_in_bytes = IntegerFile("memory.memsw.usage_in_bytes", volatile=True)
+    memsw_max_usage_in_bytes = IntegerFile("memory.memsw.max_usage_in_bytes", volatile=True)
     swappiness = IntegerFile("memory.swappiness")
 
-    stat = DictFile("memory.stat", readonly=True)
+    stat = DictFile("memory.stat", readonly=True, volatile=True)
 
     use_hierarchy = FlagFile("memory.use_hierarchy")
     force_empty = FlagFile("memory.force_empty")
-    oom_control = DictOrFlagFile("memory.oom_control")
+    oom_control = DictOrFlagFile("memory.oom_control", volatile=True)
 
     move_charge_at_immigrate = BitFieldFile("memory.move_charge_at_immigrate")
 
@@ -240,11 +355,17 @@ class DevicesController(Controller):
     devices.list
     """
 
+    __slots__ = ()
+
     allow = TypedFile("devices.allow", DeviceAccess, writeonly=True)
     deny = TypedFile("devices.deny", DeviceAccess, writeonly=True)
     list = TypedFile("devices.list", DeviceAccess, readonly=True, many=True)
 
 
+# Parses any blkio statistics file per device, for BlkIOController.device_stats
+_blkio_stats = BlkIOStatsFile("blkio")
+
+
 class BlkIOController(Controller):
     """
     blkio.io_merged
@@ -276,41 +397,65 @@ class BlkIOController(Controller):
     blkio.weight_device
     """
 
-    io_merged = SplitValueFile("blkio.io_merged", 1, int)
-    io_merged_recursive = SplitValueFile("blkio.io_merged_recursive", 1, int)
-    io_queued = SplitValueFile("blkio.io_queued", 1, int)
-    io_queued_recursive = SplitValueFile("blkio.io_queued_recursive", 1, int)
-    io_service_bytes = SplitValueFile("blkio.io_service_bytes", 1, int)
-    io_service_bytes_recursive = SplitValueFile("blkio.io_service_bytes_recursive", 1, int)
-    io_serviced = SplitValueFile("blkio.io_serviced", 1, int)
-    io_serviced_recursive = SplitValueFile("blkio.io_serviced_recursive", 1, int)
-    io_service_time = SplitValueFile("blkio.io_service_time", 1, int)
-    io_service_time_recursive = SplitValueFile("blkio.io_service_time_recursive", 1, int)
-    io_wait_time = SplitValueFile("blkio.io_wait_time", 1, int)
-    io_wait_time_recursive = SplitValueFile("blkio.io_wait_time_recursive", 1, int)
+    __slots__ = ()
+
+    io_merged = SplitValueFile("blkio.io_merged", 1, int, volatile=True)
+    io_merged_recursive = SplitValueFile("blkio.io_merged_recursive", 1, int, volatile=True)
+    io_queued = SplitValueFile("blkio.io_queued", 1, int, volatile=True)
+    io_queued_recursive = SplitValueFile("blkio.io_queued_recursive", 1, int, volatile=True)
+    io_service_bytes = SplitValueFile("blkio.io_service_bytes", 1, int, volatile=True)
+    io_service_bytes_recursive = SplitValueFile("blkio.io_service_bytes_recursive", 1, int, volatile=True)
+    io_serviced = SplitValueFile("blkio.io_serviced", 1, int, volatile=True)
+    io_serviced_recursive = SplitValueFile("blkio.io_serviced_recursive", 1, int, volatile=True)
+    io_service_time = SplitValueFile("blkio.io_service_time", 1, int, volatile=True)
+    io_service_time_recursive = SplitValueFile("blkio.io_service_time_recursive", 1, int, volatile=True)
+    io_wait_time = SplitValueFile("blkio.io_wait_time", 1, int, volatile=True)
+    io_wait_time_recursive = SplitValueFile("blkio.io_wait_time_recursive", 1, int, volatile=True)
     leaf_weight = IntegerFile("blkio.leaf_weight")
     # TODO: Uncomment the following properties after researching how to interact with files
     # leaf_weight_device =
     reset_stats = IntegerFile("blkio.reset_stats")
-    # sectors =
-    # sectors_recursive =
-    # throttle_io_service_bytes =
-    # throttle_io_serviced =
+    sectors = BlkIOStatsFile("blkio.sectors", volatile=True)
+    sectors_recursive = BlkIOStatsFile("blkio.sectors_recursive", volatile=True)
+    throttle_io_service_bytes = BlkIOStatsFile("blkio.throttle.io_service_bytes", volatile=True)
+    throttle_io_serviced = BlkIOStatsFile("blkio.throttle.io_serviced", volatile=True)
     throttle_read_bps_device = TypedFile("blkio.throttle.read_bps_device", contenttype=DeviceThrottle, many=True)
     throttle_read_iops_device = TypedFile("blkio.throttle.read_iops_device", contenttype=DeviceThrottle, many=True)
     throttle_write_bps_device = TypedFile("blkio.throttle.write_bps_device ", contenttype=DeviceThrottle, many=True)
     throttle_write_iops_device = TypedFile("blkio.throttle.write_iops_device ", contenttype=DeviceThrottle, many=True)
-    # time =
-    # time_recursive =
+    time = BlkIOStatsFile("blkio.time", volatile=True)
+    time_recursive = BlkIOStatsFile("blkio.time_recursive", volatile=True)
     weight = IntegerFile("blkio.weight")
     # weight_device =
 
+    def device_stats(self, key):
+        """
+        Read any blkio statistics interface per device and operation, e.g. device_stats("io_service_bytes") gives
+        {(8, 0, 'Read'): 4096, (8, 0, 'Write'): 0, ...} where the io_service_bytes attribute only gives the total.
+        Returns None if the file is missing or unreadable, as get_content does.
+        """
+        interface = self.get_interface(key)
+        # Only the statistics have the per device layout, e.g. weight or the throttle limits do not
+        if not isinstance(interface, (SplitValueFile, BlkIOStatsFile)):
+            raise ValueError("{} is not a blkio statistics interface".format(key))
+
+        try:
+            content = self.get_raw_property(interface.filename)
+        except IOError as e:
+            if e.errno in UNREADABLE_ERRNOS:
+                return None
+            raise
+
+        return _blkio_stats.sanitize_get_bytes(content)
+
 
 class NetClsController(Controller):
 
     """
     net_cls.classid
     """
+
+    __slots__ = ()
     class_id = IntegerFile("net_cls.classid")
 
 
@@ -320,5 +465,7 @@ class NetPrioController(Controller):
     net_prio.prioidx
     net_prio.ifpriomap
     """
+
+    __slots__ = ()
     prioidx = IntegerFile("net_prio.prioidx", readonly=True)
     ifpriomap = DictFile("net_prio.ifpriomap")
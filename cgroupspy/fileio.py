@@ -0,0 +1,202 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import errno
+import io
+import os
+import threading
+from collections import OrderedDict
+
+# cgroupfs fills a read with whole records, at least a page's worth when there is more data. A shorter result means
+# the end of the file was reached, without an extra read to find out.
+EOF_HINT = 2048
+
+_local = threading.local()
+_preadv = getattr(os, "preadv", None)
+
+
+def _get_buffer(size, keep=0):
+    """A bytearray of at least size bytes, reused by every read of the calling thread. Growing it keeps the first
+    keep bytes."""
+    buf = getattr(_local, "buffer", None)
+    if buf is None or len(buf) < size:
+        grown = bytearray(size)
+        if keep:
+            grown[:keep] = buf[:keep]
+        buf = _local.buffer = grown
+    return buf
+
+
+def _release_view(view):
+    # memoryview.release() is Python 3 only, on Python 2 the view is freed with its last reference
+    release = getattr(view, "release", None)
+    if release is not None:
+        release()
+
+
+def _read_into(readinto, size):
+    """
+    Read to the end with readinto(view, offset), growing the per-thread buffer as needed. Returns bytes.
+    """
+    buf = _get_buffer(size)
+    view = memoryview(buf)
+    try:
+        total = readinto(view, 0)
+        if total < EOF_HINT:
+            return view[:total].tobytes()
+
+        while True:
+            if total == len(buf):
+                _release_view(view)
+                buf = _get_buffer(len(buf) * 2, keep=total)
+                view = memoryview(buf)
+            count = readinto(view[total:], total)
+            if not count:
+                return view[:total].tobytes()
+            total += count
+    finally:
+        _release_view(view)
+
+
+def read_file(path, bufsize=4096):
+    """
+    Returns the content of a file as bytes. The file is read with readinto() into a per-thread buffer, skipping the
+    text layer and the decoding of open().
+    """
+    with io.FileIO(path, "r") as f:
+        return _read_into(lambda view, offset: f.readinto(view), bufsize)
+
+
+class _CachedDescriptor(object):
+    __slots__ = ("fd", "users", "evicted")
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.users = 0
+        self.evicted = False
+
+
+class FileDescriptorCache(object):
+
+    """
+    A bounded LRU of read-only file descriptors, keyed by file path. Cached files are re-read with pread() from offset
+    0, which makes cgroupfs generate fresh content, so a read costs one syscall instead of open/read/read/close.
+
+    Descriptors of removed cgroups fail with ENODEV - they are dropped and the file is opened again once, which
+    raises ENOENT if the cgroup is really gone. Safe to share between threads.
+    """
+
+    EOF_HINT = EOF_HINT
+
+    def __init__(self, maxsize=1024, bufsize=65536):
+        if not hasattr(os, "pread"):
+            raise RuntimeError("FileDescriptorCache requires os.pread (Python 3.3+)")
+
+        self.maxsize = maxsize
+        self.bufsize = bufsize
+        self._descriptors = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        """Number of open descriptors"""
+        return len(self._descriptors)
+
+    def _acquire(self, path):
+        with self._lock:
+            entry = self._descriptors.pop(path, None)
+            if entry is not None:
+                self._descriptors[path] = entry
+                entry.users += 1
+                return entry
+
+        entry = _CachedDescriptor(os.open(path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0)))
+        entry.users += 1
+        with self._lock:
+            existing = self._descriptors.pop(path, None)
+            if existing is not None:
+                self._evict(existing)
+            self._descriptors[path] = entry
+            while len(self._descriptors) > self.maxsize:
+                self._evict(self._descriptors.popitem(last=False)[1])
+        return entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry.users -= 1
+            if entry.evicted and not entry.users:
+                os.close(entry.fd)
+
+    def _evict(self, entry):
+        # Descriptors still being read from are closed by the last reader
+        entry.evicted = True
+        if not entry.users:
+            os.close(entry.fd)
+
+    def discard(self, path):
+        """Close the descriptor of a file, if it is cached"""
+        with self._lock:
+            entry = self._descriptors.pop(path, None)
+            if entry is not None:
+                self._evict(entry)
+
+    def clear(self):
+        """Close all descriptors"""
+        with self._lock:
+            while self._descriptors:
+                self._evict(self._descriptors.popitem()[1])
+
+    def _pread(self, fd):
+        if _preadv is not None:
+            return _read_into(lambda view, offset: _preadv(fd, [view], offset), self.bufsize)
+
+        chunk = os.pread(fd, self.bufsize, 0)
+        if len(chunk) < self.EOF_HINT:
+            return chunk
+
+        chunks = [chunk]
+        offset = len(chunk)
+        while chunk:
+            chunk = os.pread(fd, self.bufsize, offset)
+            chunks.append(chunk)
+            offset += len(chunk)
+        return b"".join(chunks)
+
+    def read(self, path):
+        """Returns the content of a file as bytes"""
+        for attempt in range(2):
+            entry = self._acquire(path)
+            try:
+                return self._pread(entry.fd)
+            except OSError as e:
+                if e.errno not in (errno.ENODEV, errno.ESTALE):
+                    raise
+                # The cgroup was removed since the file was opened
+                self.discard(path)
+            finally:
+                self._release(entry)
+
+        raise IOError(errno.ENODEV, os.strerror(errno.ENODEV), path)
@@ -35,11 +35,14 @@ class BaseFileInterface(object):
 
     """
     Basic cgroups file interface, implemented as a python descriptor. Provides means to get and set cgroup properties.
+    Volatile interfaces are counters and statistics the kernel keeps changing, which are never served from a
+    read cache.
     """
     readonly = False
     writeonly = False
+    volatile = False
 
-    def __init__(self, filename, readonly=None, writeonly=None):
+    def __init__(self, filename, readonly=None, writeonly=None, volatile=None):
         if readonly and writeonly:
             raise RuntimeError("This interface cannot be both readonly and writeonly")
 
@@ -49,13 +52,20 @@ class BaseFileInterface(object):
             self.filename = filename
         self.readonly = readonly or self.readonly
         self.writeonly = writeonly or self.writeonly
+        self.volatile = volatile or self.volatile
 
     def __get__(self, instance, owner):
         if self.writeonly:
             raise RuntimeError("This interface is writeonly")
 
-        value = instance.get_property(self.filename)
-        return self.sanitize_get(value)
+        read_cache = getattr(instance, "read_cache", None)
+        if read_cache is not None:
+            return self.sanitize_get_bytes(read_cache.get(instance, self))
+
+        get_raw_property = getattr(instance, "get_raw_property", None)
+        if get_raw_property is None:
+            return self.sanitize_get(instance.get_property(self.filename))
+        return self.sanitize_get_bytes(get_raw_property(self.filename))
 
     def __set__(self, instance, value):
         if self.readonly:
@@ -68,6 +78,10 @@ class BaseFileInterface(object):
     def sanitize_get(self, value):
         return value
 
+    def sanitize_get_bytes(self, value):
+        """Parse the raw content of the file. Interfaces that can parse bytes override it to skip the decoding."""
+        return self.sanitize_get(value.decode().strip())
+
     def sanitize_set(self, value):
         return value
 
@@ -121,6 +135,10 @@ class IntegerFile(BaseFileInterface):
             val = None
         return val
 
+    def sanitize_get_bytes(self, value):
+        # int() takes bytes and ignores the surrounding whitespace
+        return self.sanitize_get(value)
+
     def sanitize_set(self, value):
         if value is None:
             value = -1
@@ -128,13 +146,44 @@ class IntegerFile(BaseFileInterface):
 
 
 class DictFile(BaseFileInterface):
-    def sanitize_get(self, value):
+
+    """
+    Get/set "key value" lines. Reading can be limited to some of the keys, and works on the raw bytes as well.
+    """
+
+    def sanitize_get(self, value, keys=None):
+        """
+        :param value: str | bytes -> The file content. Keys are returned as str either way.
+        :param keys: None | iterable -> Only convert these keys, and stop reading once all of them were found
+        """
+        binary = isinstance(value, bytes)
+        lines = value.split(b"\n" if binary else "\n")
+
         res = {}
-        for el in value.split("\n"):
-            key, val = el.split()
-            res[key] = int(val)
+        if keys is None:
+            for line in lines:
+                parts = line.split()
+                if not parts:
+                    continue
+                key, val = parts
+                res[key.decode() if binary else key] = int(val)
+            return res
+
+        wanted = set(key.encode() if binary and not isinstance(key, bytes) else key for key in keys)
+        for line in lines:
+            parts = line.split(None, 1)
+            if not parts or parts[0] not in wanted:
+                continue
+            key = parts[0]
+            res[key.decode() if binary else key] = int(parts[1])
+            wanted.discard(key)
+            if not wanted:
+                break
         return res
 
+    def sanitize_get_bytes(self, value):
+        return self.sanitize_get(value)
+
     def sanitize_set(self, value):
         if not isinstance(value, dict):
             raise ValueError("Value {} must be a dict".format(value))
@@ -249,6 +298,9 @@ class MultiLineIntegerFile(BaseFileInterface):
         int_list = [int(val) for val in value.strip().split("\n") if val]
         return int_list
 
+    def sanitize_get_bytes(self, value):
+        return [int(val) for val in value.split()]
+
     def sanitize_set(self, value):
         if value is None:
             return '-1'
@@ -258,19 +310,20 @@ class MultiLineIntegerFile(BaseFileInterface):
 
 class SplitValueFile(BaseFileInterface):
     """
-    Example: Getting int(10) for file with value 'Total 10'. Readonly.
+    Example: Getting int(10) for file with value 'Total 10'. Readonly. Only the last line is used, which holds the
+    total in the blkio statistics files.
     """
     readonly = True
 
-    def __init__(self, filename, position, restype=None, splitchar=" ", prefix="Total"):
-        super(SplitValueFile, self).__init__(filename)
+    def __init__(self, filename, position, restype=None, splitchar=" ", prefix="Total", volatile=None):
+        super(SplitValueFile, self).__init__(filename, volatile=volatile)
         self.position = position
         self.restype = restype
         self.splitchar = splitchar
         self.prefix = prefix
 
     def sanitize_get(self, value):
-        res = value.strip().split(self.splitchar)[self.position]
+        res = value.strip().rsplit("\n", 1)[-1].split(self.splitchar)[self.position]
         if self.restype and not isinstance(res, self.restype):
             return self.restype(res)
         return res
@@ -279,16 +332,46 @@ class SplitValueFile(BaseFileInterface):
         return '{}{}{}'.format(self.prefix, self.splitchar, value)
 
 
+class BlkIOStatsFile(BaseFileInterface):
+
+    """
+    Per-device blkio statistics, keyed by (major, minor, operation). Files without operations, like blkio.sectors,
+    get None for it. The grand "Total" line is left out.
+
+    Example: '8:0 Read 4096\n8:0 Write 0\nTotal 4096' becomes {(8, 0, 'Read'): 4096, (8, 0, 'Write'): 0}
+    """
+    readonly = True
+
+    def sanitize_get(self, value):
+        return self.sanitize_get_bytes(value.encode())
+
+    def sanitize_get_bytes(self, value):
+        res = {}
+        for line in value.split(b"\n"):
+            parts = line.split()
+            if len(parts) == 3:
+                device, operation, val = parts
+                operation = operation.decode()
+            elif len(parts) == 2 and parts[0] != b"Total":
+                device, val = parts
+                operation = None
+            else:
+                continue
+            major, _, minor = device.partition(b":")
+            res[(int(major), int(minor), operation)] = int(val)
+        return res
+
+
 class TypedFile(BaseFileInterface):
 
-    def __init__(self, filename, contenttype, readonly=None, writeonly=None, many=False):
+    def __init__(self, filename, contenttype, readonly=None, writeonly=None, many=False, volatile=None):
         if not issubclass(contenttype, BaseContentType):
             raise RuntimeError("Contenttype should be a class inheriting "
                                "from BaseContentType, not {}".format(contenttype))
 
         self.contenttype = contenttype
         self.many = many
-        super(TypedFile, self).__init__(filename, readonly=readonly, writeonly=writeonly)
+        super(TypedFile, self).__init__(filename, readonly=readonly, writeonly=writeonly, volatile=volatile)
 
     def sanitize_set(self, value):
         if isinstance(value, self.contenttype):
@@ -322,8 +405,8 @@ class TypedFile(BaseFileInterface):
 
 
 class DictOrFlagFile(BaseFileInterface):
-    def __init__(self, filename, readonly=None, writeonly=None):
-        super(DictOrFlagFile, self).__init__(filename, readonly=readonly, writeonly=writeonly)
+    def __init__(self, filename, readonly=None, writeonly=None, volatile=None):
+        super(DictOrFlagFile, self).__init__(filename, readonly=readonly, writeonly=writeonly, volatile=volatile)
         self.interfaces = {
             'dict': DictFile(filename),
             'flag': FlagFile(filename),
@@ -0,0 +1,85 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import os
+
+
+def _directories(target):
+    """The cgroup directories of a Controller, Node or NodeControlGroup"""
+    # Nodes of any hierarchy, including the ones without a controller class, like pids or freezer
+    nodes = getattr(target, "nodes", None)
+    if nodes is not None:
+        return [node.full_path for node in nodes]
+    if hasattr(target, "filepath"):
+        return [target.node.full_path]
+    full_path = getattr(target, "full_path", None)
+    if full_path is not None:
+        return [full_path]
+    raise ValueError("Cannot migrate tasks to {!r}".format(target))
+
+
+def _write_pids(path, pids, results):
+    """Write the PIDs to a file one at a time, on a single descriptor, recording the errno of the ones that fail"""
+    fd = os.open(path, os.O_WRONLY | getattr(os, "O_CLOEXEC", 0))
+    try:
+        for pid in pids:
+            if results.get(pid):
+                # Gone, or refused by another hierarchy
+                continue
+            try:
+                os.write(fd, str(pid).encode())
+            except OSError as e:
+                results[pid] = e.errno
+            else:
+                results[pid] = 0
+    finally:
+        os.close(fd)
+
+
+def migrate(pids, target, threads=False):
+    """
+    Move tasks into a cgroup. The kernel takes a single PID per write, so they are written one by one on one open
+    descriptor per hierarchy. Setting controller.tasks or controller.procs to a list only moves the first PID.
+
+    A PID that cannot be moved does not stop the others. Tasks that exited in the meantime fail with ESRCH, and
+    kernel threads that cannot be moved with EINVAL.
+
+    >>> results = migrate([1234, 1240], vm_tree.get_vm_node("vm1"), threads=True)
+    >>> [pid for pid, error in results.items() if error and error != errno.ESRCH]
+    []
+
+    :param pids: iterable -> Task IDs, or process IDs with threads
+    :param target: Controller | Node | NodeControlGroup -> Where to move the tasks. A NodeControlGroup moves them in
+                                                            every hierarchy it has a node in.
+    :param threads: bool -> Move whole thread groups, through cgroup.procs, instead of single tasks
+    :return: dict -> {pid: 0 if it moved, otherwise the errno of the failed write}
+    """
+    filename = b"cgroup.procs" if threads else b"tasks"
+    pids = list(pids)
+    results = {}
+    for directory in _directories(target):
+        _write_pids(os.path.join(directory, filename), pids, results)
+    return results
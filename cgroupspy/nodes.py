@@ -31,7 +31,7 @@ import os
 
 from .controllers import CpuAcctController, CpuController, CpuSetController, MemoryController, DevicesController, \
     BlkIOController, NetClsController, NetPrioController
-from .utils import walk_tree, walk_up_tree
+from .utils import walk_tree, walk_up_tree, walk_loaded_tree, iter_subdirectories, get_mtime
 
 
 LOG = logging.getLogger(__name__)
@@ -60,7 +60,13 @@ class Node(object):
         b"net_prio": NetPrioController,
     }
 
-    def __init__(self, name, parent=None):
+    __slots__ = ("name", "verbose_name", "parent", "path", "path_index", "mtime", "node_type", "controller_type",
+                 "controller", "_children", "__weakref__")
+
+    def __init__(self, name, parent=None, lazy=False):
+        """
+        :param lazy: bool -> Read the node's children from the filesystem on first access. Those children are lazy too.
+        """
         if isinstance(name, str):
             name = name.encode()
 
@@ -71,13 +77,28 @@ class Node(object):
             raise ValueError('Parent should be another Node')
 
         self.parent = parent
-        self.children = []
+        # Nodes are never moved to another parent, so their paths are computed once
+        if parent is None:
+            self.path = b"/"
+        else:
+            self.path = os.path.join(parent.path, name)
+
+        self._children = None if lazy else []
+        # mtime of the directory when the children were last read, None if they were never fully read
+        self.mtime = None
         self.node_type = self._get_node_type()
         self.controller_type = self._get_controller_type()
         self.controller = self._get_controller()
 
+        # path -> node mapping, shared by every node in the same hierarchy
+        if parent is None:
+            self.path_index = {self.path: self}
+        else:
+            self.path_index = parent.path_index
+
     def __eq__(self, other):
-        if isinstance(other, self.__class__) and self.full_path == other.full_path:
+        # The name is the last component of the full path, and cheaper to compare first
+        if isinstance(other, self.__class__) and self.name == other.name and self.full_path == other.full_path:
             return True
         return False
 
@@ -88,21 +109,30 @@ class Node(object):
     def full_path(self):
         """Absolute system path to the node"""
 
-        if self.parent:
-            return os.path.join(self.parent.full_path, self.name)
-        return self.name
+        if self.parent is None:
+            return self.name
+        # The root's name is the mount point, so the path is not stored twice
+        return self.path_index[b"/"].name.rstrip(b"/") + self.path
 
     @property
-    def path(self):
-        """Node's relative path from the root node"""
+    def children(self):
+        if self._children is None:
+            self._load_children()
+        return self._children
+
+    def _load_children(self):
+        """Read the children of a lazy node from the filesystem"""
+        self._children = []
+        self.mtime = get_mtime(self.full_path)
+        for dir_name in iter_subdirectories(self.full_path):
+            child = Node(dir_name, parent=self, lazy=True)
+            self._children.append(child)
+            self.path_index[child.path] = child
 
-        if self.parent:
-            try:
-                parent_path = self.parent.path.encode()
-            except AttributeError:
-                parent_path = self.parent.path
-            return os.path.join(parent_path, self.name)
-        return b"/"
+    @property
+    def children_loaded(self):
+        """False for a lazy node whose children were not read yet"""
+        return self._children is not None
 
     def _get_node_type(self):
         """Returns the current node's type"""
@@ -135,6 +165,45 @@ class Node(object):
             return self.CONTROLLERS[self.controller_type](self)
         return None
 
+    def add_child(self, node):
+        """
+        Attach a node, created with this node as its parent, and register it in the path index.
+        Use get_child first - for a lazy node, this reads the existing children from the filesystem.
+        """
+        self.children.append(node)
+        self.path_index[node.path] = node
+        return node
+
+    def remove_child(self, node):
+        """
+        Detach a child node and drop it and all of its descendants from the path index.
+        """
+        self.remove_children([node])
+
+    def remove_children(self, nodes):
+        """
+        Detach several child nodes in a single pass over the children, and drop them and all of their descendants
+        from the path index.
+        """
+        detached = set(id(node) for node in nodes)
+        self._children = [child for child in self.children if id(child) not in detached]
+        for node in nodes:
+            for descendant in walk_loaded_tree(node):
+                if self.path_index.get(descendant.path) is descendant:
+                    del self.path_index[descendant.path]
+
+    def get_child(self, name):
+        """Returns the direct child with the given name or None"""
+        if isinstance(name, str):
+            name = name.encode()
+
+        if self._children is None:
+            self._load_children()
+        node = self.path_index.get(os.path.join(self.path, name))
+        if node is not None and node.parent is self:
+            return node
+        return None
+
     def create_cgroup(self, name):
         """
         Create a cgroup by name and attach it under this node.
@@ -142,8 +211,7 @@ class Node(object):
         if isinstance(name, str):
             name = name.encode()
 
-        node = Node(name, parent=self)
-        if node in self.children:
+        if self.get_child(name) is not None:
             raise RuntimeError('Node {} already exists under {}'.format(name, self.path))
 
         fp = os.path.join(self.full_path, name)
@@ -153,23 +221,21 @@ class Node(object):
             if e.errno != errno.EEXIST:
                 raise
 
-        self.children.append(node)
-        return node
+        return self.add_child(Node(name, parent=self))
 
     def delete_cgroup(self, name):
         """
         Delete a cgroup by name and detach it from this node.
         Raises OSError if the cgroup is not empty.
         """
-        name = name.encode()
+        if isinstance(name, str):
+            name = name.encode()
         fp = os.path.join(self.full_path, name)
         if os.path.exists(fp):
             os.rmdir(fp)
-        node = Node(name, parent=self)
-        try:
-            self.children.remove(node)
-        except ValueError:
-            return
+        node = self.get_child(name)
+        if node is not None:
+            self.remove_child(node)
 
     def delete_empty_children(self):
         """
@@ -186,16 +252,16 @@ class Node(object):
             except OSError:
                 pass
 
-        for child in removed_children:
-            self.children.remove(child)
+        if removed_children:
+            self.remove_children(removed_children)
 
-    def walk(self):
-        """Walk through this node and its children - pre-order depth-first"""
-        return walk_tree(self)
+    def walk(self, prune=None, max_depth=None):
+        """Walk through this node and its children - pre-order depth-first. See utils.walk_tree"""
+        return walk_tree(self, prune=prune, max_depth=max_depth)
 
-    def walk_up(self):
-        """Walk through this node and its children - post-order depth-first"""
-        return walk_up_tree(self)
+    def walk_up(self, prune=None, max_depth=None):
+        """Walk through this node and its children - post-order depth-first. See utils.walk_up_tree"""
+        return walk_up_tree(self, prune=prune, max_depth=max_depth)
 
 
 class NodeControlGroup(object):
@@ -214,21 +280,33 @@ class NodeControlGroup(object):
     Requires a basic Node tree to be generated.
     """
 
+    # The controllers are also attributes - group.cpu, group.memory, etc. The types in Node.CONTROLLERS have slots,
+    # the ones registered later go to __dict__, which is only allocated for them.
+    __slots__ = ("name", "parent", "path", "path_index", "controllers", "nodes", "_children_map", "_loader",
+                 "__dict__", "__weakref__") + tuple(controller_type.decode() for controller_type in Node.CONTROLLERS)
+
     def __init__(self, name, parent=None):
         self.name = name
         self.parent = parent
-        self.children_map = {}
+        # Groups are never moved to another parent, so their paths are computed once
+        if parent is None:
+            self.path = b"/"
+        else:
+            base_name, ext = os.path.splitext(name)
+            if ext not in [b'.slice', b'.scope', b'.partition']:
+                base_name = name
+            self.path = os.path.join(parent.path, base_name)
+
+        self._children_map = {}
+        self._loader = None
         self.controllers = {}
         self.nodes = []
 
-    @property
-    def path(self):
-        if self.parent:
-            base_name, ext = os.path.splitext(self.name)
-            if ext not in [b'.slice', b'.scope', b'.partition']:
-                base_name = self.name
-            return os.path.join(self.parent.path, base_name)
-        return b"/"
+        # path -> group mapping, shared by every group in the same hierarchy
+        if parent is None:
+            self.path_index = {self.path: self}
+        else:
+            self.path_index = parent.path_index
 
     def add_node(self, node):
         """
@@ -244,6 +322,68 @@ class NodeControlGroup(object):
             self.controllers[node.controller_type] = node.controller
             setattr(self, node.controller_type.decode(), node.controller)
 
+    def add_child(self, group):
+        """
+        Attach a group, created with this group as its parent, and register it in the path index.
+        Groups whose extension-stripped path collides with an existing one keep the first registration.
+        """
+        self.children_map[group.name] = group
+        self.path_index.setdefault(group.path, group)
+        return group
+
+    def get_child(self, name):
+        """Returns the direct child group by name, with or without its slice/scope/partition extension"""
+        if isinstance(name, str):
+            name = name.encode()
+
+        group = self.children_map.get(name)
+        if group is None:
+            group = self.path_index.get(os.path.join(self.path, name))
+            if group is not None and group.parent is not self:
+                group = None
+        return group
+
+    def remove_node(self, node):
+        """
+        Remove a Node object from the group, along with its controller.
+        """
+        self.nodes = [n for n in self.nodes if n is not node]
+        if node.controller and self.controllers.get(node.controller_type) is node.controller:
+            del self.controllers[node.controller_type]
+            delattr(self, node.controller_type.decode())
+
+    def remove_child(self, group):
+        """
+        Detach a child group and drop it and its built descendants from the path index. Returns the detached groups.
+        """
+        del self.children_map[group.name]
+
+        removed = []
+        stack = [group]
+        while stack:
+            descendant = stack.pop()
+            removed.append(descendant)
+            if self.path_index.get(descendant.path) is descendant:
+                del self.path_index[descendant.path]
+            stack.extend(descendant._children_map.values())
+        return removed
+
+    def defer_children(self, loader):
+        """Populate children_map by calling loader(self) on its first access"""
+        self._loader = loader
+
+    @property
+    def children_loaded(self):
+        """False for a group whose children are deferred and were not loaded yet"""
+        return self._loader is None
+
+    @property
+    def children_map(self):
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            loader(self)
+        return self._children_map
+
     def __repr__(self):
         return "<{} {}>".format(self.__class__.__name__, self.name.decode())
 
@@ -273,6 +413,8 @@ class NodeVM(NodeControlGroup):
 
     """Abstraction of a QEMU virtual machine node."""
 
+    __slots__ = ()
+
     @property
     def verbose_name(self):
         try:
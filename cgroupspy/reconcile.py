@@ -0,0 +1,131 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+from collections import namedtuple
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+from .transaction import Transaction
+from .utils import get_node_controller
+
+# A value that differs from the desired one. current is the value read, or None if the file could not be read.
+Change = namedtuple("Change", ["path", "controller", "key", "current", "desired"])
+
+# changes: the Change of every value that differed; missing: the (path, controller) pairs not found in the tree
+Reconciliation = namedtuple("Reconciliation", ["changes", "missing"])
+
+
+def _normalize(interface, value):
+    """The value as it would be written to the file"""
+    return str(interface.sanitize_set(value))
+
+
+_MISSING = object()
+
+
+def _previous(interface, current):
+    """The content of a file, rebuilt from the value read, for the transaction to compare and roll back to"""
+    if current is _MISSING:
+        return None
+    if current == '':
+        return current
+    try:
+        return _normalize(interface, current)
+    except (TypeError, ValueError):
+        return None
+
+
+def _differs(interface, current, desired):
+    if current is _MISSING or current == '':
+        return True
+    try:
+        return _normalize(interface, current) != _normalize(interface, desired)
+    except (TypeError, ValueError):
+        return True
+
+
+def reconcile(tree, desired, dry_run=False, workers=None):
+    """
+    Bring cgroups to a desired state, writing only the values that differ. The current values are read with one
+    Controller.snapshot per controller, and both sides are compared as they would be written, through the
+    interfaces' sanitize_set, so e.g. {3, 2, 1, 0} matches a cpuset.cpus of "0-3". The writes go through a
+    Transaction, which orders them and rolls them back if one fails. It is given the values read here, so the files
+    are read only once.
+
+    >>> reconcile(vm_tree, {b"/machine/vm1.libvirt-qemu": {"memory": {"limit_in_bytes": 2 ** 30},
+    ...                                                    "cpuset": {"cpus": {0, 1}}}})
+    Reconciliation(changes=[Change(path=b'/machine/vm1.libvirt-qemu', controller='memory', ...)], missing=[])
+
+    :param tree: Tree | GroupedTree | VMTree -> The tree the paths are looked up in, with get_node_by_path
+    :param desired: dict -> {path: {controller type: {interface name: value}}}
+    :param dry_run: bool -> Only report the changes
+    :param workers: None | int -> Read the current values in a pool of that many threads
+    :return: Reconciliation
+    """
+    targets = []
+    missing = []
+    for path, controllers in desired.items():
+        node = tree.get_node_by_path(path)
+        for controller_type, values in controllers.items():
+            key = controller_type if isinstance(controller_type, bytes) else controller_type.encode()
+            controller = get_node_controller(node, key) if node is not None else None
+            if controller is None:
+                missing.append((path, controller_type))
+                continue
+            interfaces = []
+            for name in values:
+                interface = controller.get_interface(name)
+                if interface is None:
+                    raise AttributeError("{} has no interface {}".format(controller.__class__.__name__, name))
+                interfaces.append((name, interface))
+            targets.append((path, controller_type, controller, values, interfaces))
+
+    def read(target):
+        return target[2].snapshot(list(target[3]))
+
+    if workers and len(targets) > 1:
+        if ThreadPoolExecutor is None:
+            raise RuntimeError("Reading with workers requires concurrent.futures (the futures package on Python 2)")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            snapshots = list(executor.map(read, targets))
+    else:
+        snapshots = [read(target) for target in targets]
+
+    changes = []
+    transaction = Transaction()
+    for (path, controller_type, controller, values, interfaces), current in zip(targets, snapshots):
+        for name, interface in interfaces:
+            value = values[name]
+            if _differs(interface, current.get(name, _MISSING), value):
+                changes.append(Change(path, controller_type, name, current.get(name), value))
+                transaction.set(controller, name, value, previous=_previous(interface, current.get(name, _MISSING)))
+
+    if not dry_run:
+        transaction.commit()
+    return Reconciliation(changes, missing)
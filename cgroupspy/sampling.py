@@ -0,0 +1,153 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+from array import array
+from collections import namedtuple
+
+from .utils import monotonic, get_node_controller
+
+
+# The change of a counter over a sampling interval, and the change per second. Both are None when the counter went
+# backwards (it was reset), and lists for counters that are lists, like cpuacct.usage_percpu.
+CounterRate = namedtuple("CounterRate", ["delta", "rate"])
+
+
+class RateSampler(object):
+
+    """
+    Turns cumulative cgroup counters into per-interval deltas and rates. The previous values of every node are kept
+    in one flat list, with the monotonic time they were read at.
+
+    Counters are named "<controller>.<interface>", with a ".<key>" suffix for dict interfaces:
+
+    >>> sampler = RateSampler(tree.get_vm_node("vm1").children, ["cpuacct.usage", "cpu.stat.throttled_time"])
+    >>> sampler.sample()  # the first sample only records the values
+    {}
+    >>> sampler.sample()
+    {b'/machine/vm1.libvirt-qemu/vcpu0': {'cpuacct.usage': CounterRate(delta=21000000, rate=20920000.4), ...}, ...}
+
+    cpuacct.usage is in nanoseconds, so its rate divided by 10 ** 7 is the CPU usage in percent.
+    """
+
+    def __init__(self, nodes, counters):
+        """
+        :param nodes: list -> Nodes or NodeControlGroups
+        :param counters: list -> Counter names, e.g. ["cpuacct.usage", "cpuacct.usage_percpu", "cpu.stat.nr_throttled"]
+        """
+        self.nodes = list(nodes)
+        self.counters = list(counters)
+        self.vanished = []
+
+        self._counters = []
+        keys_by_controller = {}
+        for counter in self.counters:
+            parts = counter.split(".", 2)
+            if len(parts) < 2:
+                raise ValueError("Counter {} must be named <controller>.<interface>[.<key>]".format(counter))
+            controller_type = parts[0].encode()
+            self._counters.append((counter, controller_type, parts[1], parts[2] if len(parts) > 2 else None))
+            keys = keys_by_controller.setdefault(controller_type, [])
+            if parts[1] not in keys:
+                keys.append(parts[1])
+        self._reads = list(keys_by_controller.items())
+
+        self._previous = [None] * len(self.nodes)
+        self._times = array("d", [0.0] * len(self.nodes))
+
+    def _read(self, node):
+        """The counter values of a node, or None if any of them cannot be read"""
+        snapshots = {}
+        for controller_type, keys in self._reads:
+            controller = get_node_controller(node, controller_type)
+            if controller is None:
+                return None
+            snapshots[controller_type] = controller.snapshot(keys)
+
+        values = []
+        for _, controller_type, key, subkey in self._counters:
+            value = snapshots[controller_type].get(key)
+            if subkey is not None and isinstance(value, dict):
+                value = value.get(subkey)
+            if value is None or value == '':
+                return None
+            values.append(value)
+        return values
+
+    def sample(self):
+        """
+        Read the counters of every node. Nodes whose counters cannot be read, usually because the cgroup is gone,
+        are listed in self.vanished and start over when they are back.
+
+        :return: dict -> {node path: {counter name: CounterRate}}, for the nodes that were also read the last time
+        """
+        result = {}
+        vanished = []
+        for i, node in enumerate(self.nodes):
+            values = self._read(node)
+            now = monotonic()
+            if values is None:
+                self._previous[i] = None
+                vanished.append(node.path)
+                continue
+
+            # A list rather than an array("q") - Python 2 arrays have no 64 bit type
+            current = []
+            widths = []
+            for value in values:
+                if isinstance(value, list):
+                    current.extend(value)
+                    widths.append(len(value))
+                else:
+                    current.append(value)
+                    widths.append(None)
+
+            previous = self._previous[i]
+            elapsed = now - self._times[i]
+            self._previous[i] = current
+            self._times[i] = now
+            if previous is None or len(previous) != len(current) or elapsed <= 0:
+                continue
+
+            rates = {}
+            position = 0
+            for (counter, _, _, _), width in zip(self._counters, widths):
+                if width is None:
+                    rates[counter] = _rate(current[position] - previous[position], elapsed)
+                    position += 1
+                else:
+                    per_item = [_rate(current[j] - previous[j], elapsed) for j in range(position, position + width)]
+                    rates[counter] = CounterRate([r.delta for r in per_item], [r.rate for r in per_item])
+                    position += width
+            result[node.path] = rates
+
+        self.vanished = vanished
+        return result
+
+
+def _rate(delta, elapsed):
+    if delta < 0:
+        return CounterRate(None, None)
+    return CounterRate(delta, delta / elapsed)
@@ -0,0 +1,173 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import json
+import os
+import struct
+import zlib
+from array import array
+
+from .nodes import Node
+from .utils import walk_loaded_tree
+
+# Snapshot file layout
+#
+#     MAGIC
+#     header length - uint32, little endian
+#     header - JSON: format version, root path, groups, sub-groups, lazy flag, node count
+#     zlib compressed payload:
+#         node names - NUL separated, pre-order, without the root
+#         parent indices - int32 per node
+#         directory mtimes - int64 per node, little endian, -1 when the children were never fully read
+#         flags - uint8 per node, FLAG_CHILDREN_LOADED
+#
+# Node and controller types are not stored, they follow from the names and the parents when the nodes are created.
+# The int32 indices use the native byte order - a snapshot is meant to be loaded on the host it was taken on.
+# The mtimes are packed with struct, as Python 2 arrays have no 64 bit type.
+
+MAGIC = b"CGSPYSNAP"
+VERSION = 1
+FLAG_CHILDREN_LOADED = 1
+
+_HEADER_LENGTH = struct.Struct("<I")
+_MTIME = struct.Struct("<q")
+
+
+def _to_bytes(arr):
+    try:
+        return arr.tobytes()
+    except AttributeError:
+        return arr.tostring()
+
+
+def _from_bytes(typecode, data):
+    arr = array(typecode)
+    try:
+        arr.frombytes(data)
+    except AttributeError:
+        arr.fromstring(data)
+    return arr
+
+
+def _decode(value):
+    # latin-1 maps every byte to a code point and back, so any path survives the JSON round trip
+    if isinstance(value, bytes):
+        return value.decode("latin-1")
+    return value
+
+
+def dump_nodes(path, root, root_path, groups=(), sub_groups=(), lazy=False):
+    """
+    Save a node hierarchy to a snapshot file. The file is replaced atomically.
+    Children of lazy nodes that were never read are not saved - they are read again after loading.
+    """
+    indices = {}
+    names = []
+    parents = array("i")
+    mtimes = []
+    flags = array("B")
+
+    for idx, node in enumerate(walk_loaded_tree(root)):
+        indices[id(node)] = idx
+        if node.parent is None:
+            parents.append(-1)
+        else:
+            names.append(node.name)
+            parents.append(indices[id(node.parent)])
+        mtimes.append(-1 if node.mtime is None else int(node.mtime))
+        flags.append(FLAG_CHILDREN_LOADED if node.children_loaded else 0)
+
+    header = json.dumps({
+        "version": VERSION,
+        "root_path": _decode(root_path),
+        "groups": [_decode(group) for group in groups],
+        "sub_groups": [_decode(sub_group) for sub_group in sub_groups],
+        "lazy": bool(lazy),
+        "count": len(parents),
+    }).encode("ascii")
+    payload = zlib.compress(b"".join([
+        b"\0".join(names),
+        _to_bytes(parents),
+        struct.pack("<{}q".format(len(mtimes)), *mtimes),
+        _to_bytes(flags),
+    ]), 1)
+
+    tmp_path = path + (b".tmp" if isinstance(path, bytes) else ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        f.write(payload)
+    os.rename(tmp_path, path)
+
+
+def load_nodes(path):
+    """
+    Load a node hierarchy from a snapshot file, without touching the cgroup filesystem.
+
+    :return: tuple -> The root node and the header dict, with root_path and groups as bytes
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if not data.startswith(MAGIC):
+        raise ValueError("{} is not a cgroupspy snapshot".format(path))
+    offset = len(MAGIC)
+    header_length, = _HEADER_LENGTH.unpack_from(data, offset)
+    offset += _HEADER_LENGTH.size
+    header = json.loads(data[offset:offset + header_length].decode("ascii"))
+    if header["version"] != VERSION:
+        raise ValueError("Unsupported snapshot version {}".format(header["version"]))
+    header["root_path"] = header["root_path"].encode("latin-1")
+    header["groups"] = [group.encode("latin-1") for group in header["groups"]]
+
+    payload = zlib.decompress(data[offset + header_length:])
+    count = header["count"]
+    int_size = array("i").itemsize
+    long_size = _MTIME.size
+    names_length = len(payload) - count * (int_size + long_size + 1)
+
+    names = payload[:names_length].split(b"\0") if count > 1 else []
+    offset = names_length
+    parents = _from_bytes("i", payload[offset:offset + count * int_size])
+    offset += count * int_size
+    mtimes = struct.unpack_from("<{}q".format(count), payload, offset)
+    offset += count * long_size
+    flags = _from_bytes("B", payload[offset:offset + count])
+
+    root = Node(header["root_path"], lazy=not flags[0] & FLAG_CHILDREN_LOADED)
+    nodes = [root]
+    for idx in range(1, count):
+        parent = nodes[parents[idx]]
+        node = Node(names[idx - 1], parent=parent, lazy=not flags[idx] & FLAG_CHILDREN_LOADED)
+        parent.add_child(node)
+        nodes.append(node)
+
+    for node, mtime in zip(nodes, mtimes):
+        if mtime != -1:
+            node.mtime = mtime
+
+    return root, header
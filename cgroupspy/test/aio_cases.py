@@ -0,0 +1,94 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from ..aio import AsyncExecutor
+from ..trees import Tree, GroupedTree
+from .test_trees import make_hierarchy
+
+
+class AsyncExecutorTest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, self.root)
+        make_hierarchy(self.root, [b"cpu/a/b", b"cpu/c", b"memory/a"], files=(b"cpu.shares", b"memory.limit_in_bytes"))
+        self.executor = AsyncExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown)
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_properties(self):
+        tree = Tree(root_path=self.root)
+        ctl = tree.get_node_by_path(b"/cpu/a").controller
+        self.run_async(self.executor.set_property(ctl, b"cpu.shares", 512))
+        self.assertEqual(self.run_async(self.executor.get_property(ctl, b"cpu.shares")), "512")
+        self.assertEqual(self.run_async(self.executor.get_content(ctl, "shares")), 512)
+
+        self.run_async(self.executor.set_content(ctl, "shares", 256))
+        self.assertEqual(ctl.shares, 256)
+        self.assertEqual(self.run_async(self.executor.snapshot(ctl, ["shares"])), {"shares": 256})
+        with self.assertRaises(AttributeError):
+            self.run_async(self.executor.set_content(ctl, "bostan", 1))
+
+    def test_create_and_delete_cgroup(self):
+        tree = Tree(root_path=self.root)
+        parent = tree.get_node_by_path(b"/cpu/c")
+
+        async def create(names):
+            return await asyncio.gather(*[self.executor.create_cgroup(parent, name) for name in names])
+
+        names = [b"x", b"y", b"z"]
+        created = self.run_async(create(names))
+        self.assertEqual([node.name for node in created], names)
+        self.assertEqual(sorted(child.name for child in parent.children), names)
+        self.assertTrue(os.path.isdir(os.path.join(self.root, b"cpu/c/x")))
+
+        self.run_async(self.executor.delete_cgroup(parent, b"x"))
+        self.assertIsNone(tree.get_node_by_path(b"/cpu/c/x"))
+        self.assertFalse(os.path.exists(os.path.join(self.root, b"cpu/c/x")))
+
+    def test_walk(self):
+        tree = GroupedTree(root_path=self.root)
+        tree.get_node_by_path(b"/a").cpu.shares = 100
+
+        async def collect():
+            return dict([(group.path, values) async for group, values in self.executor.walk(tree.control_root, "cpu", ["shares"])])
+
+        self.assertEqual(self.run_async(collect()), {b"/": {}, b"/a": {"shares": 100}, b"/a/b": {"shares": ''}, b"/c": {"shares": ''}})
+
+        async def collect_nodes():
+            return sorted([node.path async for node, _ in self.executor.walk(tree.node_tree.root, "memory")])
+
+        self.assertEqual(self.run_async(collect_nodes()), [b"/memory", b"/memory/a"])
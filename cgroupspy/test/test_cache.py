@@ -0,0 +1,111 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import shutil
+import tempfile
+from collections import namedtuple
+from unittest import TestCase
+
+import mock
+
+from ..cache import ReadCache
+from ..controllers import Controller, MemoryController, CpuController
+from ..interfaces import IntegerFile, FlagFile
+
+
+class ReadCacheTest(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.node = namedtuple("node", "full_path")(self.tmp)
+        self.ctl = MemoryController(self.node)
+        self.ctl.set_property(b"memory.limit_in_bytes", 1024)
+        self.ctl.set_property(b"memory.usage_in_bytes", 10)
+
+    def test_hits_and_misses(self):
+        self.ctl.read_cache = cache = ReadCache(ttl=60)
+        self.assertEqual(self.ctl.limit_in_bytes, 1024)
+        with mock.patch.object(MemoryController, "get_raw_property") as get_raw_property:
+            self.assertEqual(self.ctl.limit_in_bytes, 1024)
+        self.assertFalse(get_raw_property.called)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_volatile_not_cached(self):
+        self.ctl.read_cache = cache = ReadCache(ttl=60)
+        self.assertEqual(self.ctl.usage_in_bytes, 10)
+        with open(self.ctl.filepath(b"memory.usage_in_bytes"), "w") as f:
+            f.write("20")
+        self.assertEqual(self.ctl.usage_in_bytes, 20)
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 0, "size": 0})
+
+        cache = ReadCache(ttl=60, volatile_ttl=60)
+        self.ctl.read_cache = cache
+        self.assertEqual(self.ctl.usage_in_bytes, 20)
+        self.assertEqual(self.ctl.usage_in_bytes, 20)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_write_invalidates(self):
+        self.ctl.read_cache = cache = ReadCache(ttl=60)
+        self.assertEqual(self.ctl.limit_in_bytes, 1024)
+        self.ctl.limit_in_bytes = 2048
+        self.assertEqual(self.ctl.limit_in_bytes, 2048)
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 2, "size": 1})
+
+    def test_expiry(self):
+        self.ctl.read_cache = cache = ReadCache(ttl=1)
+        with mock.patch("cgroupspy.cache.monotonic", return_value=100.0):
+            self.assertEqual(self.ctl.limit_in_bytes, 1024)
+        with open(self.ctl.filepath(b"memory.limit_in_bytes"), "w") as f:
+            f.write("4096")
+        with mock.patch("cgroupspy.cache.monotonic", return_value=100.5):
+            self.assertEqual(self.ctl.limit_in_bytes, 1024)
+        with mock.patch("cgroupspy.cache.monotonic", return_value=101.0):
+            self.assertEqual(self.ctl.limit_in_bytes, 4096)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 2, "size": 1})
+
+    def test_ttls_by_type(self):
+        cache = ReadCache(ttl=5, ttls={IntegerFile: 0, FlagFile: 30})
+        self.assertEqual(cache.get_ttl(self.ctl.get_interface("limit_in_bytes")), 0)
+        self.assertEqual(cache.get_ttl(self.ctl.get_interface("use_hierarchy")), 30)
+        self.assertEqual(cache.get_ttl(CpuController(self.node).get_interface("stat")), 0)
+        self.assertEqual(cache.get_ttl(self.ctl.get_interface("move_charge_at_immigrate")), 5)
+
+    def test_default_read_cache(self):
+        cache = ReadCache(ttl=60)
+        self.assertIsNone(self.ctl.read_cache)
+        with mock.patch.object(Controller, "default_read_cache", cache):
+            self.assertIs(self.ctl.read_cache, cache)
+            self.assertEqual(self.ctl.limit_in_bytes, 1024)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_maxsize(self):
+        cache = ReadCache(ttl=60, maxsize=2)
+        self.ctl.read_cache = cache
+        for name in ["limit_in_bytes", "soft_limit_in_bytes", "swappiness"]:
+            self.ctl.set_property(self.ctl.get_interface(name).filename, 1)
+            getattr(self.ctl, name)
+        self.assertEqual(cache.stats()["size"], 1)
@@ -24,13 +24,16 @@ ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
+import errno
 import tempfile
-from unittest import TestCase
+from unittest import TestCase, skipUnless
 from collections import namedtuple
 
+import mock
 import os
 
-from ..controllers import Controller
+from ..controllers import Controller, CpuController, DevicesController, MemoryController, BlkIOController
+from ..fileio import FileDescriptorCache, read_file
 
 
 class TestControllers(TestCase):
@@ -54,3 +57,135 @@ class TestControllers(TestCase):
         self.assertEqual(saved, val)
         self.assertIsNotNone(ctl.get_interface('tasks'))
         self.assertIsNone(ctl.get_interface('bostan'))
+
+    def test_snapshot(self):
+        node = namedtuple("node", "full_path")(tempfile.mkdtemp().encode())
+        ctl = CpuController(node)
+        ctl.set_property(b"cpu.shares", "1024\n")
+        ctl.set_property(b"cpu.cfs_quota_us", "\n")
+        ctl.set_property(b"tasks", "1\n2\n")
+        ctl.set_property(b"cgroup.procs", "1\n")
+
+        self.assertEqual(ctl.snapshot(), {"shares": 1024, "cfs_quota_us": '', "tasks": [1, 2], "procs": [1]})
+        self.assertEqual(ctl.snapshot(["shares", "bostan", "stat"]), {"shares": 1024})
+
+        ctl.set_property(b"cpu.stat", "nr_periods 1\nnr_throttled 0\nthrottled_time 0\n")
+        self.assertEqual(ctl.snapshot(["stat"]), {"stat": {"nr_periods": 1, "nr_throttled": 0, "throttled_time": 0}})
+
+    def test_get_dict(self):
+        node = namedtuple("node", "full_path")(tempfile.mkdtemp().encode())
+        ctl = MemoryController(node)
+        ctl.set_property(b"memory.stat", "cache 10\nrss 20\nswap 0\n")
+        self.assertEqual(ctl.get_raw_property(b"memory.stat"), b"cache 10\nrss 20\nswap 0\n")
+        self.assertEqual(ctl.get_dict("stat", ["rss", "cache"]), {"rss": 20, "cache": 10})
+        self.assertEqual(ctl.get_dict("stat"), {"cache": 10, "rss": 20, "swap": 0})
+        self.assertIsNone(CpuController(node).get_dict("stat"))
+        with self.assertRaises(ValueError):
+            ctl.get_dict("limit_in_bytes")
+
+    def test_blkio_device_stats(self):
+        node = namedtuple("node", "full_path")(tempfile.mkdtemp().encode())
+        ctl = BlkIOController(node)
+        ctl.set_property(b"blkio.io_service_bytes", "8:0 Read 4096\n8:0 Write 512\nTotal 4608\n")
+        ctl.set_property(b"blkio.sectors", "8:0 9\n")
+        self.assertEqual(ctl.io_service_bytes, 4608)
+        self.assertEqual(ctl.device_stats("io_service_bytes"), {(8, 0, "Read"): 4096, (8, 0, "Write"): 512})
+        self.assertEqual(ctl.sectors, {(8, 0, None): 9})
+        self.assertEqual(ctl.snapshot(["sectors", "time"]), {"sectors": {(8, 0, None): 9}})
+        self.assertIsNone(ctl.device_stats("io_serviced"))
+        for key in ("bostan", "weight", "throttle_read_bps_device"):
+            with self.assertRaises(ValueError):
+                ctl.device_stats(key)
+
+    def test_snapshot_skips_writeonly(self):
+        node = namedtuple("node", "full_path")(tempfile.mkdtemp().encode())
+        ctl = DevicesController(node)
+        ctl.set_property(b"devices.allow", "a *:* rwm\n")
+        ctl.set_property(b"devices.list", "a *:* rwm\n")
+        self.assertEqual(sorted(ctl.snapshot()), ["list"])
+        self.assertEqual(ctl.snapshot(["allow"]), {})
+
+
+@skipUnless(hasattr(os, "pread"), "os.pread is not available")
+class TestFileDescriptorCache(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp().encode()
+        node_class = namedtuple("node", "full_path")
+        self.node = node_class(self.tmp)
+        self.fd_cache = FileDescriptorCache(maxsize=2)
+        self.addCleanup(self.fd_cache.clear)
+
+    def test_reads_fresh_content(self):
+        ctl = CpuController(self.node)
+        ctl.fd_cache = self.fd_cache
+        ctl.set_property(b"cpu.shares", 1024)
+        self.assertEqual(ctl.shares, 1024)
+        ctl.shares = 2048
+        self.assertEqual(ctl.shares, 2048)
+        self.assertEqual(self.fd_cache.size, 1)
+
+    def test_lru(self):
+        ctl = Controller(self.node)
+        ctl.fd_cache = self.fd_cache
+        for filename in [b"a", b"b", b"c"]:
+            ctl.set_property(filename, filename.decode())
+            self.assertEqual(ctl.get_property(filename), filename.decode())
+        self.assertEqual(self.fd_cache.size, 2)
+        self.assertEqual(list(self.fd_cache._descriptors), [os.path.join(self.tmp, b"b"), os.path.join(self.tmp, b"c")])
+
+    def test_large_file(self):
+        ctl = Controller(self.node)
+        ctl.fd_cache = FileDescriptorCache(bufsize=4096)
+        value = "\n".join(str(pid) for pid in range(100000))
+        ctl.set_property(b"tasks", value)
+        self.assertEqual(ctl.tasks, list(range(100000)))
+        ctl.fd_cache.clear()
+
+    def test_removed_cgroup(self):
+        ctl = CpuController(self.node)
+        ctl.fd_cache = self.fd_cache
+        ctl.set_property(b"cpu.shares", 1024)
+        self.assertEqual(ctl.shares, 1024)
+
+        # cgroupfs fails reads from files of removed cgroups with ENODEV
+        os.remove(os.path.join(self.tmp, b"cpu.shares"))
+        enodev = OSError(errno.ENODEV, "No such device")
+        with mock.patch("os.pread", side_effect=enodev), mock.patch("cgroupspy.fileio._preadv", side_effect=enodev):
+            self.assertIsNone(ctl.get_content("shares"))
+        self.assertEqual(self.fd_cache.size, 0)
+
+        ctl.set_property(b"cpu.shares", 512)
+        self.assertEqual(ctl.shares, 512)
+
+    def test_default_fd_cache(self):
+        ctl = Controller(self.node)
+        self.assertIsNone(ctl.fd_cache)
+        with mock.patch.object(Controller, "default_fd_cache", self.fd_cache):
+            self.assertIs(ctl.fd_cache, self.fd_cache)
+
+
+class TestReadFile(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp().encode()
+
+    def write(self, content):
+        path = os.path.join(self.tmp, b"file")
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_small(self):
+        self.assertEqual(read_file(self.write(b"1024\n")), b"1024\n")
+        self.assertEqual(read_file(self.write(b"")), b"")
+
+    def test_grows_buffer(self):
+        content = b"".join(b"%d\n" % pid for pid in range(100000))
+        self.assertEqual(read_file(self.write(content), bufsize=4096), content)
+        self.assertEqual(read_file(self.write(b"12\n"), bufsize=4096), b"12\n")
+
+    def test_missing(self):
+        with self.assertRaises(IOError) as ctx:
+            read_file(os.path.join(self.tmp, b"missing"))
+        self.assertEqual(ctx.exception.errno, errno.ENOENT)
@@ -30,7 +30,7 @@ import mock
 
 from ..contenttypes import DeviceAccess, DeviceThrottle
 from ..interfaces import BaseFileInterface, FlagFile, BitFieldFile, CommaDashSetFile, DictFile, \
-    IntegerFile, IntegerListFile, ListFile, MultiLineIntegerFile, TypedFile
+    IntegerFile, IntegerListFile, ListFile, MultiLineIntegerFile, TypedFile, BlkIOStatsFile
 
 
 class FaceHolder(object):
@@ -141,6 +141,36 @@ class InterfacesTest(TestCase):
         fh = FaceHolder("ala 123\nbala 123\nnica 456")
         self.assertEqual(fh.face, {"ala": 123, "bala": 123, "nica": 456})
 
+    def test_dict_file_keys(self):
+        face = DictFile("dictfile")
+        content = "ala 123\nbala 123\nnica 456\n\n"
+        self.assertEqual(face.sanitize_get(content), {"ala": 123, "bala": 123, "nica": 456})
+        self.assertEqual(face.sanitize_get(content, keys=["nica", "ala", "missing"]), {"ala": 123, "nica": 456})
+        self.assertEqual(face.sanitize_get(content.encode()), {"ala": 123, "bala": 123, "nica": 456})
+        self.assertEqual(face.sanitize_get(content.encode(), keys=["bala"]), {"bala": 123})
+        self.assertEqual(face.sanitize_get(content.encode(), keys=[b"bala"]), {"bala": 123})
+
+        # Lines after the last wanted key are not parsed
+        self.assertEqual(face.sanitize_get("ala 1\nbroken\n", keys=["ala"]), {"ala": 1})
+
+    def test_sanitize_get_bytes(self):
+        self.assertEqual(IntegerFile("intfile").sanitize_get_bytes(b"1024\n"), 1024)
+        self.assertIsNone(IntegerFile("intfile").sanitize_get_bytes(b"-1\n"))
+        self.assertEqual(MultiLineIntegerFile("tasks").sanitize_get_bytes(b"1\n2\n3\n"), [1, 2, 3])
+        self.assertEqual(MultiLineIntegerFile("tasks").sanitize_get_bytes(b""), [])
+        self.assertEqual(DictFile("dictfile").sanitize_get_bytes(b"ala 1\nbala 2\n"), {"ala": 1, "bala": 2})
+        self.assertEqual(FlagFile("flagfile").sanitize_get_bytes(b"1\n"), True)
+        self.assertEqual(CommaDashSetFile("cpus").sanitize_get_bytes(b"0-2,5\n"), {0, 1, 2, 5})
+
+    def test_blkio_stats_file(self):
+        face = BlkIOStatsFile("blkio.io_service_bytes")
+        content = "8:0 Read 4096\n8:0 Write 512\n8:16 Read 0\n8:16 Total 0\nTotal 4608\n"
+        expected = {(8, 0, "Read"): 4096, (8, 0, "Write"): 512, (8, 16, "Read"): 0, (8, 16, "Total"): 0}
+        self.assertEqual(face.sanitize_get(content), expected)
+        self.assertEqual(face.sanitize_get_bytes(content.encode()), expected)
+        self.assertEqual(face.sanitize_get_bytes(b"8:0 120\n253:1 7\n"), {(8, 0, None): 120, (253, 1, None): 7})
+        self.assertEqual(face.sanitize_get_bytes(b"Total 0\n"), {})
+
     def test_int_file(self):
         self.patch_face(face=IntegerFile("intfile"))
         fh = FaceHolder("16")
@@ -0,0 +1,104 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import errno
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+
+from ..migration import migrate
+from ..trees import GroupedTree
+from .test_trees import make_hierarchy
+
+
+class MigrateTest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, self.root)
+        make_hierarchy(self.root, [b"cpu/vm", b"memory/vm"])
+        self.tree = GroupedTree(root_path=self.root)
+        self.group = self.tree.get_node_by_path(b"/vm")
+
+    def record_writes(self, errors=None):
+        """Patch os.write to record the (filename, data) of every write, failing the PIDs in errors"""
+        errors = errors or {}
+        writes = []
+        original = os.write
+
+        def write(fd, data):
+            path = os.readlink("/proc/self/fd/{}".format(fd))
+            pid = int(data)
+            writes.append((os.path.relpath(path, self.root.decode()), pid))
+            if pid in errors:
+                raise OSError(errors[pid], os.strerror(errors[pid]))
+            return original(fd, data)
+
+        patch = mock.patch("os.write", side_effect=write)
+        patch.start()
+        self.addCleanup(patch.stop)
+        return writes
+
+    def test_one_pid_per_write(self):
+        writes = self.record_writes()
+        results = migrate([10, 11, 12], self.group.cpu)
+        self.assertEqual(results, {10: 0, 11: 0, 12: 0})
+        self.assertEqual(writes, [("cpu/vm/tasks", 10), ("cpu/vm/tasks", 11), ("cpu/vm/tasks", 12)])
+
+    def test_group_and_threads(self):
+        writes = self.record_writes()
+        migrate([10], self.group, threads=True)
+        self.assertEqual(sorted(writes), [("cpu/vm/cgroup.procs", 10), ("memory/vm/cgroup.procs", 10)])
+
+        del writes[:]
+        migrate([11], self.group.memory.node)
+        self.assertEqual(writes, [("memory/vm/tasks", 11)])
+
+    def test_group_without_controller_class(self):
+        make_hierarchy(self.root, [b"pids/vm", b"freezer/vm"])
+        group = GroupedTree(root_path=self.root).get_node_by_path(b"/vm")
+        writes = self.record_writes()
+        migrate([10], group)
+        self.assertEqual(sorted(writes), [
+            ("cpu/vm/tasks", 10), ("freezer/vm/tasks", 10), ("memory/vm/tasks", 10), ("pids/vm/tasks", 10),
+        ])
+
+    def test_failures_do_not_stop_the_others(self):
+        writes = self.record_writes(errors={11: errno.ESRCH, 12: errno.EINVAL})
+        results = migrate([10, 11, 12, 13], self.group)
+        self.assertEqual(results, {10: 0, 11: errno.ESRCH, 12: errno.EINVAL, 13: 0})
+        # Failed PIDs are not written to the other hierarchies
+        self.assertEqual(sorted(pid for _, pid in writes), [10, 10, 11, 12, 13, 13])
+
+    def test_missing_cgroup(self):
+        shutil.rmtree(os.path.join(self.root, b"cpu/vm"))
+        with self.assertRaises(OSError):
+            migrate([10], self.group.cpu)
+        with self.assertRaises(ValueError):
+            migrate([10], object())
@@ -0,0 +1,103 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipIf
+
+import mock
+
+from ..controllers import Controller
+from ..reconcile import reconcile, Change, ThreadPoolExecutor
+from ..trees import Tree, GroupedTree
+from .test_trees import make_hierarchy
+
+
+class ReconcileTest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, self.root)
+        make_hierarchy(self.root, [b"memory/vm", b"cpuset/vm", b"cpu/vm"], files=())
+        self.write(b"memory/vm/memory.limit_in_bytes", 4096)
+        self.write(b"cpuset/vm/cpuset.cpus", "0-3")
+        self.write(b"cpu/vm/cpu.shares", 1024)
+
+    def write(self, path, value):
+        with open(os.path.join(self.root, path), "w") as f:
+            f.write("{}\n".format(value))
+
+    def read(self, path):
+        with open(os.path.join(self.root, path)) as f:
+            return f.read()
+
+    def test_writes_only_differences(self):
+        tree = GroupedTree(root_path=self.root)
+        desired = {b"/vm": {
+            "memory": {"limit_in_bytes": "4096"},
+            "cpuset": {"cpus": [3, 2, 1, 0]},
+            "cpu": {"shares": 512, "cfs_quota_us": None},
+        }}
+        with mock.patch.object(Controller, "set_property", autospec=True, side_effect=vars(Controller)["set_property"]) as set_property:
+            with mock.patch.object(Controller, "get_raw_property", autospec=True,
+                                   side_effect=vars(Controller)["get_raw_property"]) as get_raw_property:
+                result = reconcile(tree, desired)
+
+        self.assertEqual(sorted(result.changes), [
+            Change(b"/vm", "cpu", "cfs_quota_us", None, None),
+            Change(b"/vm", "cpu", "shares", 1024, 512),
+        ])
+        self.assertEqual(result.missing, [])
+        self.assertEqual(sorted(call[0][1] for call in set_property.call_args_list), [b"cpu.cfs_quota_us", b"cpu.shares"])
+        # Each file is read once, the transaction is given the values read
+        self.assertEqual(get_raw_property.call_count, 4)
+        self.assertEqual(self.read(b"cpu/vm/cpu.shares"), "512")
+        self.assertEqual(self.read(b"cpu/vm/cpu.cfs_quota_us"), "-1")
+
+    @skipIf(ThreadPoolExecutor is None, "concurrent.futures is not available")
+    def test_workers(self):
+        tree = GroupedTree(root_path=self.root)
+        desired = {b"/vm": {"memory": {"limit_in_bytes": 4096}, "cpu": {"shares": 512}}}
+        self.assertEqual(reconcile(tree, desired, workers=2).changes, [Change(b"/vm", "cpu", "shares", 1024, 512)])
+        self.assertEqual(self.read(b"cpu/vm/cpu.shares"), "512")
+        self.assertEqual(reconcile(tree, desired, workers=2).changes, [])
+
+    def test_dry_run_and_missing(self):
+        tree = Tree(root_path=self.root)
+        desired = {
+            b"/cpu/vm": {"cpu": {"shares": 2}, "memory": {"limit_in_bytes": 1}},
+            b"/cpu/nope": {"cpu": {"shares": 2}},
+        }
+        result = reconcile(tree, desired, dry_run=True)
+        self.assertEqual(result.changes, [Change(b"/cpu/vm", "cpu", "shares", 1024, 2)])
+        self.assertEqual(sorted(result.missing), [(b"/cpu/nope", "cpu"), (b"/cpu/vm", "memory")])
+        self.assertEqual(self.read(b"cpu/vm/cpu.shares"), "1024\n")
+
+    def test_unknown_interface(self):
+        tree = GroupedTree(root_path=self.root)
+        with self.assertRaises(AttributeError):
+            reconcile(tree, {b"/vm": {"cpu": {"bostan": 1}}})
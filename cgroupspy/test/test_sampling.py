@@ -0,0 +1,106 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+
+from ..sampling import RateSampler, CounterRate
+from ..trees import Tree, GroupedTree
+from .test_trees import make_hierarchy
+
+
+class RateSamplerTest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, self.root)
+        make_hierarchy(self.root, [b"cpu/a", b"cpuacct/a"], files=())
+        self.write(b"cpuacct/a/cpuacct.usage", 1000)
+        self.write(b"cpuacct/a/cpuacct.usage_percpu", "600 400")
+        self.write(b"cpu/a/cpu.stat", "nr_periods 10\nnr_throttled 1\nthrottled_time 50")
+
+    def write(self, path, value):
+        with open(os.path.join(self.root, path), "w") as f:
+            f.write(str(value))
+
+    def sample(self, sampler, now):
+        with mock.patch("cgroupspy.sampling.monotonic", return_value=now):
+            return sampler.sample()
+
+    def test_rates(self):
+        tree = Tree(root_path=self.root)
+        nodes = [tree.get_node_by_path(b"/cpuacct/a")]
+        sampler = RateSampler(nodes, ["cpuacct.usage", "cpuacct.usage_percpu"])
+        self.assertEqual(self.sample(sampler, 10.0), {})
+
+        self.write(b"cpuacct/a/cpuacct.usage", 3000)
+        self.write(b"cpuacct/a/cpuacct.usage_percpu", "1600 1400")
+        self.assertEqual(self.sample(sampler, 12.0), {b"/cpuacct/a": {
+            "cpuacct.usage": CounterRate(2000, 1000.0),
+            "cpuacct.usage_percpu": CounterRate([1000, 1000], [500.0, 500.0]),
+        }})
+
+    def test_grouped_nodes_and_dict_counters(self):
+        tree = GroupedTree(root_path=self.root)
+        sampler = RateSampler([tree.get_node_by_path(b"/a")], ["cpuacct.usage", "cpu.stat.throttled_time"])
+        self.sample(sampler, 1.0)
+        self.write(b"cpu/a/cpu.stat", "nr_periods 20\nnr_throttled 2\nthrottled_time 150")
+        self.assertEqual(self.sample(sampler, 1.5), {b"/a": {
+            "cpuacct.usage": CounterRate(0, 0.0),
+            "cpu.stat.throttled_time": CounterRate(100, 200.0),
+        }})
+
+    def test_reset(self):
+        tree = Tree(root_path=self.root)
+        sampler = RateSampler([tree.get_node_by_path(b"/cpuacct/a")], ["cpuacct.usage"])
+        self.sample(sampler, 1.0)
+        self.write(b"cpuacct/a/cpuacct.usage", 10)
+        self.assertEqual(self.sample(sampler, 2.0), {b"/cpuacct/a": {"cpuacct.usage": CounterRate(None, None)}})
+        self.write(b"cpuacct/a/cpuacct.usage", 20)
+        self.assertEqual(self.sample(sampler, 3.0), {b"/cpuacct/a": {"cpuacct.usage": CounterRate(10, 10.0)}})
+
+    def test_vanished(self):
+        tree = Tree(root_path=self.root)
+        sampler = RateSampler([tree.get_node_by_path(b"/cpuacct/a")], ["cpuacct.usage"])
+        self.sample(sampler, 1.0)
+        os.remove(os.path.join(self.root, b"cpuacct/a/cpuacct.usage"))
+        self.assertEqual(self.sample(sampler, 2.0), {})
+        self.assertEqual(sampler.vanished, [b"/cpuacct/a"])
+
+        # A cgroup that comes back starts over
+        self.write(b"cpuacct/a/cpuacct.usage", 5)
+        self.assertEqual(self.sample(sampler, 3.0), {})
+        self.assertEqual(sampler.vanished, [])
+        self.write(b"cpuacct/a/cpuacct.usage", 10)
+        self.assertEqual(self.sample(sampler, 4.0), {b"/cpuacct/a": {"cpuacct.usage": CounterRate(5, 5.0)}})
+
+    def test_bad_counter(self):
+        with self.assertRaises(ValueError):
+            RateSampler([], ["usage"])
@@ -0,0 +1,100 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipIf
+
+from .. import timeseries
+from ..trees import Tree
+from .test_trees import make_hierarchy
+
+
+@skipIf(timeseries.numpy is None, "numpy is not installed")
+class PerCpuUsageStoreTest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, self.root)
+        make_hierarchy(self.root, [b"cpuacct/a", b"cpuacct/b", b"cpuacct/c"], files=())
+        self.tree = Tree(root_path=self.root)
+        self.nodes = [self.tree.get_node_by_path(path) for path in [b"/cpuacct/a", b"/cpuacct/b", b"/cpuacct/c"]]
+
+    def write(self, usage):
+        for name, values in usage.items():
+            path = os.path.join(self.root, b"cpuacct", name, b"cpuacct.usage_percpu")
+            if values is None:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            with open(path, "w") as f:
+                f.write(" ".join(str(v) for v in values) + " \n")
+
+    def test_history_and_rates(self):
+        store = timeseries.PerCpuUsageStore(ncpus=3, capacity=3)
+        self.write({b"a": [0, 0, 0], b"b": [10, 10, 10], b"c": None})
+        store.record(self.nodes, timestamp=0.0)
+        self.assertTrue(timeseries.numpy.isnan(store.rates()).all())
+
+        self.write({b"a": [100, 200, 300], b"b": [10, 30, 5], b"c": [1, 2, 3]})
+        store.record(self.nodes, timestamp=2.0)
+        self.assertEqual(store.paths, [b"/cpuacct/a", b"/cpuacct/b", b"/cpuacct/c"])
+        rates = store.rates()
+        self.assertEqual(rates[0].tolist(), [50.0, 100.0, 150.0])
+        self.assertEqual(rates[1, :2].tolist(), [0.0, 10.0])
+        # b went backwards on the last CPU and c has no previous sample
+        self.assertTrue(timeseries.numpy.isnan(rates[1, 2]))
+        self.assertTrue(timeseries.numpy.isnan(rates[2]).all())
+
+        for timestamp in [3.0, 4.0]:
+            store.record(self.nodes, timestamp=timestamp)
+        times, values = store.history(b"/cpuacct/a")
+        self.assertEqual(times.tolist(), [2.0, 3.0, 4.0])
+        self.assertEqual(values.tolist(), [[100, 200, 300]] * 3)
+        self.assertEqual(store.rates(interval=2)[0].tolist(), [0.0, 0.0, 0.0])
+        with self.assertRaises(ValueError):
+            store.rates(interval=3)
+
+    def test_top_and_sums(self):
+        store = timeseries.PerCpuUsageStore(ncpus=2)
+        self.write({b"a": [0, 0], b"b": [0, 0], b"c": [0, 0]})
+        store.record(self.nodes, timestamp=0.0)
+        self.write({b"a": [10, 0], b"b": [5, 20], b"c": None})
+        store.record(self.nodes, timestamp=1.0)
+
+        self.assertEqual(store.sums().tolist()[:2], [10.0, 25.0])
+        self.assertEqual(store.sums(cpus={0}).tolist()[:2], [10.0, 5.0])
+        self.assertEqual(store.top(5), [(b"/cpuacct/b", 25.0), (b"/cpuacct/a", 10.0)])
+        self.assertEqual(store.top(1, cpus={0}), [(b"/cpuacct/a", 10.0)])
+
+    def test_grows(self):
+        store = timeseries.PerCpuUsageStore(ncpus=1, capacity=2)
+        for i in range(40):
+            store._row(str(i))
+        self.assertEqual(len(store.paths), 40)
+        self.assertEqual(store._values.shape, (64, 2, 1))
+        self.assertTrue((store._values == -1).all())
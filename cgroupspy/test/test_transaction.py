@@ -0,0 +1,162 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import errno
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+
+from ..controllers import Controller
+from ..trees import GroupedTree
+from ..transaction import Transaction, TransactionError
+from .test_trees import make_hierarchy
+
+
+class TransactionTest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, self.root)
+        make_hierarchy(self.root, [b"memory/vm/vcpu0", b"cpuset/vm/vcpu0", b"cpu/vm"], files=())
+        self.write(b"memory/vm/memory.limit_in_bytes", 4096)
+        self.write(b"memory/vm/memory.memsw.limit_in_bytes", 8192)
+        self.write(b"cpuset/vm/cpuset.cpus", "0-3")
+        self.write(b"cpuset/vm/vcpu0/cpuset.cpus", "0-3")
+        self.write(b"cpu/vm/cpu.shares", 1024)
+        self.tree = GroupedTree(root_path=self.root)
+        self.vm = self.tree.get_node_by_path(b"/vm")
+        self.vcpu = self.tree.get_node_by_path(b"/vm/vcpu0")
+
+        self.written = []
+        self.failing = None
+        original = Controller.set_property
+
+        def set_property(controller, filename, value):
+            if filename == self.failing:
+                raise IOError(errno.EINVAL, "Invalid argument")
+            self.written.append((controller.node.path, filename, str(value)))
+            return original(controller, filename, value)
+
+        patch = mock.patch.object(Controller, "set_property", autospec=True, side_effect=set_property)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def write(self, path, value):
+        with open(os.path.join(self.root, path), "w") as f:
+            f.write("{}\n".format(value))
+
+    def test_shrink(self):
+        with Transaction() as tx:
+            tx.set(self.vm.memory, "memsw_limit_in_bytes", 2048)
+            tx.set(self.vm.memory, "limit_in_bytes", 1024)
+            tx.set(self.vm.cpuset, "cpus", {0, 1})
+            tx.set(self.vcpu.cpuset, "cpus", {0})
+
+        self.assertEqual(self.written, [
+            (b"/cpuset/vm/vcpu0", b"cpuset.cpus", "0"),
+            (b"/memory/vm", b"memory.limit_in_bytes", "1024"),
+            (b"/cpuset/vm", b"cpuset.cpus", "0-1"),
+            (b"/memory/vm", b"memory.memsw.limit_in_bytes", "2048"),
+        ])
+        self.assertEqual(self.vm.memory.limit_in_bytes, 1024)
+        self.assertEqual(self.vcpu.cpuset.cpus, {0})
+
+    def test_grow(self):
+        with Transaction() as tx:
+            tx.set(self.vcpu.cpuset, "cpus", {0, 1, 2, 3, 4, 5})
+            tx.set(self.vm.memory, "limit_in_bytes", 16384)
+            tx.set(self.vm.cpuset, "cpus", {0, 1, 2, 3, 4, 5})
+            tx.set(self.vm.memory, "memsw_limit_in_bytes", None)
+
+        self.assertEqual(self.written, [
+            (b"/cpuset/vm", b"cpuset.cpus", "0-5"),
+            (b"/memory/vm", b"memory.memsw.limit_in_bytes", "-1"),
+            (b"/memory/vm", b"memory.limit_in_bytes", "16384"),
+            (b"/cpuset/vm/vcpu0", b"cpuset.cpus", "0-5"),
+        ])
+
+    def test_coalesce_and_skip_unchanged(self):
+        tx = Transaction()
+        tx.set(self.vm.cpu, "shares", 10)
+        tx.set(self.vm.cpu, "shares", 20)
+        tx.set(self.vm.cpuset, "cpus", {0, 1, 2, 3})
+        self.assertEqual(len(tx), 2)
+        self.assertEqual(tx.commit(), 1)
+        self.assertEqual(self.written, [(b"/cpu/vm", b"cpu.shares", "20")])
+        self.assertEqual(len(tx), 0)
+
+    def test_previous(self):
+        tx = Transaction()
+        tx.set(self.vm.cpu, "shares", 20, previous="20")
+        tx.set(self.vm.memory, "limit_in_bytes", 8192, previous="2048\n")
+        tx.set(self.vm.memory, "memsw_limit_in_bytes", 4096, previous="8192")
+        with mock.patch.object(Controller, "get_property") as get_property:
+            self.assertEqual(tx.commit(), 2)
+
+        self.assertFalse(get_property.called)
+        # Known to grow from 2048, so written after the shrinking memsw limit
+        self.assertEqual(self.written, [
+            (b"/memory/vm", b"memory.memsw.limit_in_bytes", "4096"),
+            (b"/memory/vm", b"memory.limit_in_bytes", "8192"),
+        ])
+
+    def test_validation(self):
+        tx = Transaction()
+        with self.assertRaises(AttributeError):
+            tx.set(self.vm.cpu, "bostan", 1)
+        with self.assertRaises(RuntimeError):
+            tx.set(self.vm.cpu, "stat", {})
+        with self.assertRaises(ValueError):
+            tx.set(self.vm.cpuset, "cpus", {"a"})
+
+    def test_rollback(self):
+        self.failing = b"cpuset.mems"
+        tx = Transaction()
+        tx.set(self.vm.memory, "limit_in_bytes", 1024)
+        tx.set(self.vm.cpu, "shares", 2048)
+        tx.set(self.vcpu.cpuset, "mems", {0})
+        with self.assertRaises(TransactionError) as ctx:
+            tx.commit()
+
+        self.assertEqual(ctx.exception.write[1], "mems")
+        self.assertEqual(ctx.exception.error.errno, errno.EINVAL)
+        self.assertEqual(ctx.exception.rollback_errors, [])
+        self.assertEqual(self.vm.memory.limit_in_bytes, 4096)
+        self.assertEqual(self.vm.cpu.shares, 1024)
+        self.assertEqual(self.written[-2:], [
+            (b"/cpu/vm", b"cpu.shares", "1024"),
+            (b"/memory/vm", b"memory.limit_in_bytes", "4096"),
+        ])
+
+    def test_not_committed_on_error(self):
+        with self.assertRaises(KeyError):
+            with Transaction() as tx:
+                tx.set(self.vm.cpu, "shares", 2048)
+                raise KeyError()
+        self.assertEqual(self.written, [])
@@ -0,0 +1,547 @@
+"""Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CloudSigma AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import errno
+import os
+import shutil
+import tempfile
+import weakref
+from unittest import TestCase, skipIf
+
+import mock
+
+from ..controllers import Controller
+from ..nodes import Node
+from ..transaction import TransactionError
+from ..trees import BaseTree, Tree, GroupedTree, VMTree, ThreadPoolExecutor
+
+
+def make_hierarchy(root, paths, files=(b"tasks", b"cgroup.procs")):
+    """Create a fake cgroup hierarchy under root - every path is a directory, holding a few control files"""
+    for path in paths:
+        full_path = os.path.join(root, path)
+        os.makedirs(full_path)
+        for filename in files:
+            with open(os.path.join(full_path, filename), "w") as f:
+                f.write("")
+
+
+class BaseTreeTestCase(TestCase):
+    paths = [
+        b"cpu/machine/vm1.libvirt-qemu/emulator",
+        b"cpu/machine/vm1.libvirt-qemu/vcpu0",
+        b"cpu/user.slice",
+        b"memory/machine/vm1.libvirt-qemu/emulator",
+        b"memory/system.slice/sshd.service",
+    ]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, self.root)
+        make_hierarchy(self.root, self.paths)
+
+
+class TreeTest(BaseTreeTestCase):
+
+    def test_get_node_by_path(self):
+        tree = Tree(root_path=self.root)
+        self.assertIs(tree.get_node_by_path("/"), tree.root)
+        node = tree.get_node_by_path("/cpu/machine/vm1.libvirt-qemu/")
+        self.assertEqual(node.name, b"vm1.libvirt-qemu")
+        self.assertEqual(node.path, b"/cpu/machine/vm1.libvirt-qemu")
+        self.assertIsNone(tree.get_node_by_path("/cpu/nope"))
+
+        for walked in tree.walk():
+            self.assertIs(tree.get_node_by_path(walked.path), walked)
+
+    def test_index_follows_create_and_delete(self):
+        tree = Tree(root_path=self.root)
+        machine = tree.get_node_by_path(b"/cpu/machine")
+
+        created = machine.create_cgroup("vm2")
+        self.assertTrue(os.path.isdir(created.full_path))
+        self.assertIs(tree.get_node_by_path(b"/cpu/machine/vm2"), created)
+        self.assertRaises(RuntimeError, machine.create_cgroup, "vm2")
+
+        machine.delete_cgroup("vm2")
+        self.assertIsNone(tree.get_node_by_path(b"/cpu/machine/vm2"))
+        self.assertNotIn(created, machine.children)
+
+    def test_index_follows_delete_empty_children(self):
+        # cgroupfs allows removing directories with control files in them, a plain filesystem does not
+        shutil.rmtree(self.root)
+        make_hierarchy(self.root, self.paths, files=())
+
+        tree = Tree(root_path=self.root)
+        machine = tree.get_node_by_path(b"/memory/machine")
+        machine.delete_empty_children()
+        self.assertEqual(machine.children, [])
+        self.assertIsNone(tree.get_node_by_path(b"/memory/machine/vm1.libvirt-qemu"))
+        self.assertIsNone(tree.get_node_by_path(b"/memory/machine/vm1.libvirt-qemu/emulator"))
+
+    def test_sub_groups(self):
+        tree = Tree(root_path=self.root, groups=[b"cpu"], sub_groups=["machine/vm1.libvirt-qemu", "/user.slice/"])
+        self.assertEqual([node.name for node in tree.root.children], [b"cpu"])
+        self.assertEqual(sorted(node.name for node in tree.root.children[0].children), [b"machine", b"user.slice"])
+        self.assertIsNotNone(tree.get_node_by_path(b"/cpu/machine/vm1.libvirt-qemu/vcpu0"))
+
+    def test_sub_groups_are_created(self):
+        tree = Tree(root_path=self.root, groups=[b"memory"], sub_groups=["machine/vm2"])
+        node = tree.get_node_by_path(b"/memory/machine/vm2")
+        self.assertTrue(os.path.isdir(node.full_path))
+
+    def test_lazy(self):
+        tree = Tree(root_path=self.root, lazy=True)
+        cpu = tree.get_node_by_path(b"/cpu")
+        memory = tree.get_node_by_path(b"/memory")
+        self.assertFalse(cpu.children_loaded)
+
+        node = tree.get_node_by_path(b"/cpu/machine/vm1.libvirt-qemu/vcpu0")
+        self.assertEqual(node.full_path, os.path.join(self.root, b"cpu/machine/vm1.libvirt-qemu/vcpu0"))
+        self.assertTrue(cpu.children_loaded)
+        self.assertFalse(memory.children_loaded)
+        self.assertFalse(tree.get_node_by_path(b"/cpu/user.slice").children_loaded)
+        self.assertIsNone(tree.get_node_by_path(b"/cpu/machine/vm2"))
+
+        eager = Tree(root_path=self.root)
+        self.assertEqual(sorted(node.path for node in tree.walk()), sorted(node.path for node in eager.walk()))
+
+    @skipIf(ThreadPoolExecutor is None, "concurrent.futures is not available")
+    def test_workers(self):
+        serial = Tree(root_path=self.root)
+        parallel = Tree(root_path=self.root, workers=4)
+        self.assertEqual([node.path for node in parallel.walk()], [node.path for node in serial.walk()])
+        self.assertEqual(sorted(parallel.root.path_index), sorted(serial.root.path_index))
+
+        serial = GroupedTree(root_path=self.root, sub_groups=["machine"])
+        parallel = GroupedTree(root_path=self.root, sub_groups=["machine"], workers=4)
+        self.assertEqual([group.path for group in parallel.walk()], [group.path for group in serial.walk()])
+
+    def test_refresh(self):
+        tree = Tree(root_path=self.root)
+        machine = tree.get_node_by_path(b"/cpu/machine")
+        self.assertEqual(tree.refresh(), ([], []))
+
+        make_hierarchy(self.root, [b"cpu/machine/vm2/emulator"])
+        shutil.rmtree(os.path.join(self.root, b"cpu/machine/vm1.libvirt-qemu"))
+        added, removed = tree.refresh()
+
+        self.assertEqual([node.path for node in added], [b"/cpu/machine/vm2", b"/cpu/machine/vm2/emulator"])
+        self.assertEqual([node.path for node in removed][0], b"/cpu/machine/vm1.libvirt-qemu")
+        self.assertEqual(len(removed), 3)
+        self.assertEqual([node.name for node in machine.children], [b"vm2"])
+        self.assertIsNone(tree.get_node_by_path(b"/cpu/machine/vm1.libvirt-qemu/vcpu0"))
+        self.assertIs(tree.get_node_by_path(b"/cpu/machine/vm2/emulator"), added[1])
+        self.assertEqual(tree.refresh(check_mtime=False), ([], []))
+
+    def test_snapshot(self):
+        tree = Tree(root_path=self.root, groups=[b"cpu", b"memory"])
+        snapshot = os.path.join(self.root, b"snapshot")
+        tree.save(snapshot)
+
+        with mock.patch.object(BaseTree, "get_children_paths") as get_children_paths:
+            loaded = Tree.load(snapshot)
+        self.assertFalse(get_children_paths.called)
+        self.assertEqual([node.path for node in loaded.walk()], [node.path for node in tree.walk()])
+        self.assertEqual(loaded.groups, [b"cpu", b"memory"])
+        self.assertEqual(loaded.get_node_by_path(b"/cpu/machine").controller_type, b"cpu")
+
+        make_hierarchy(self.root, [b"cpu/machine/vm2"])
+        loaded = Tree.load(snapshot)
+        self.assertEqual(loaded.get_node_by_path(b"/cpu/machine/vm2").name, b"vm2")
+
+    def test_snapshot_lazy(self):
+        tree = Tree(root_path=self.root, lazy=True)
+        tree.get_node_by_path(b"/cpu/machine")
+        snapshot = os.path.join(self.root, b"snapshot")
+        tree.save(snapshot)
+
+        loaded = Tree.load(snapshot, refresh=False)
+        self.assertTrue(loaded.lazy)
+        self.assertTrue(loaded.get_node_by_path(b"/cpu").children_loaded)
+        self.assertFalse(loaded.get_node_by_path(b"/memory").children_loaded)
+        self.assertEqual(sorted(node.path for node in loaded.walk()), sorted(node.path for node in tree.walk()))
+
+    @skipIf(ThreadPoolExecutor is None, "concurrent.futures is not available")
+    def test_collect(self):
+        with open(os.path.join(self.root, b"cpu/user.slice/cpu.shares"), "w") as f:
+            f.write("512\n")
+        tree = Tree(root_path=self.root)
+        # Only the leaves and user.slice hold control files
+        expected = {
+            b"/cpu": {"shares": None, "tasks": None},
+            b"/cpu/machine": {"shares": None, "tasks": None},
+            b"/cpu/machine/vm1.libvirt-qemu": {"shares": None, "tasks": None},
+            b"/cpu/machine/vm1.libvirt-qemu/emulator": {"shares": None, "tasks": ''},
+            b"/cpu/machine/vm1.libvirt-qemu/vcpu0": {"shares": None, "tasks": ''},
+            b"/cpu/user.slice": {"shares": 512, "tasks": ''},
+        }
+        self.assertEqual(tree.collect("cpu", ["shares", "tasks"]), expected)
+        self.assertEqual(tree.collect("cpu", ["shares", "tasks"], workers=3, timeout=5), expected)
+
+    def test_provision(self):
+        tree = Tree(root_path=self.root)
+        with mock.patch("os.mkdir", wraps=os.mkdir) as mkdir:
+            created = tree.provision({
+                b"/machine/vm2/vcpu0": {"cpu": {"shares": 256}},
+                b"/machine/vm2": {"cpu": {"shares": 2048}, "memory": {"limit_in_bytes": 4096}},
+                b"/system.slice/cron.service": {"memory": {}},
+            })
+
+        self.assertEqual([node.path for node in created], [
+            b"/cpu/machine/vm2",
+            b"/memory/machine/vm2",
+            b"/memory/system.slice/cron.service",
+            b"/cpu/machine/vm2/vcpu0",
+        ])
+        self.assertEqual(mkdir.call_count, 4)
+        self.assertEqual(tree.get_node_by_path(b"/cpu/machine/vm2").controller.shares, 2048)
+        self.assertEqual(tree.get_node_by_path(b"/cpu/machine/vm2/vcpu0").controller.shares, 256)
+        self.assertEqual(tree.get_node_by_path(b"/memory/machine/vm2").controller.limit_in_bytes, 4096)
+        self.assertEqual(sorted(node.path for node in tree.walk()), sorted(node.path for node in Tree(root_path=self.root).walk()))
+
+        self.assertEqual(tree.provision({b"/machine/vm2": {"cpu": {"shares": 2048}}}), [])
+        with self.assertRaises(ValueError):
+            tree.provision({b"/machine": {"blkio": {}}})
+
+    def test_provision_invalid(self):
+        make_hierarchy(self.root, [b"pids"])
+        tree = Tree(root_path=self.root)
+        for values in [{"pids": {"max": 10}}, {"cpu": {"bostan": 1}}, {"cpu": {"stat": {}}}, {"cpu": {"shares": "a lot"}}]:
+            spec = {b"/machine/vm3/a": {"memory": {}}, b"/machine/vm3": values}
+            with self.assertRaises(ValueError):
+                tree.provision(spec)
+            for hierarchy in [b"memory", b"pids", b"cpu"]:
+                self.assertFalse(os.path.exists(os.path.join(self.root, hierarchy, b"machine/vm3")))
+
+        self.assertEqual([node.path for node in tree.provision({b"/vm3": {"pids": {}}})], [b"/pids/vm3"])
+
+    def test_teardown(self):
+        root = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, root)
+        make_hierarchy(root, [b"cpu/machine/vm1/vcpu0", b"cpu/machine/vm1/vcpu1", b"memory/machine/vm1", b"cpu/other"], files=())
+        tree = Tree(root_path=root)
+
+        result = tree.teardown(b"/machine/vm1")
+        self.assertEqual(sorted(result.removed), [
+            b"/cpu/machine/vm1", b"/cpu/machine/vm1/vcpu0", b"/cpu/machine/vm1/vcpu1", b"/memory/machine/vm1",
+        ])
+        self.assertEqual(result.failed, {})
+        self.assertFalse(os.path.exists(os.path.join(root, b"cpu/machine/vm1")))
+        self.assertIsNone(tree.get_node_by_path(b"/cpu/machine/vm1/vcpu0"))
+        self.assertEqual(sorted(node.path for node in tree.walk()), sorted(node.path for node in Tree(root_path=root).walk()))
+
+        self.assertEqual(tree.teardown(b"/machine/vm1"), ([], {}))
+        with self.assertRaises(ValueError):
+            tree.teardown(b"/")
+
+    def test_teardown_failures(self):
+        root = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, root)
+        make_hierarchy(root, [b"cpu/vm/busy", b"cpu/vm/idle", b"cpu/vm/full"], files=())
+        with open(os.path.join(root, b"cpu/vm/full/tasks"), "w") as f:
+            f.write("1\n")
+        tree = Tree(root_path=root)
+
+        busy = os.path.join(root, b"cpu/vm/busy")
+        attempts = []
+        rmdir = os.rmdir
+
+        def fake_rmdir(path):
+            if path == busy:
+                attempts.append(path)
+                if len(attempts) < 3:
+                    raise OSError(errno.EBUSY, "Device or resource busy")
+            return rmdir(path)
+
+        with mock.patch("os.rmdir", side_effect=fake_rmdir), mock.patch("time.sleep") as sleep:
+            result = tree.teardown(b"/vm", delay=0.5)
+
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual([call[0][0] for call in sleep.call_args_list], [0.5, 1.0])
+        self.assertEqual(sorted(result.removed), [b"/cpu/vm/busy", b"/cpu/vm/idle"])
+        self.assertEqual(list(result.failed), [b"/cpu/vm/full", b"/cpu/vm"])
+        self.assertEqual(result.failed[b"/cpu/vm/full"].errno, errno.ENOTEMPTY)
+        self.assertEqual([child.name for child in tree.get_node_by_path(b"/cpu/vm").children], [b"full"])
+        self.assertIsNone(tree.get_node_by_path(b"/cpu/vm/idle"))
+
+    def test_teardown_move_tasks(self):
+        root = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, root)
+        # pids has no controller class
+        make_hierarchy(root, [b"cpu", b"pids"], files=(b"tasks",))
+        make_hierarchy(root, [b"cpu/vm/vcpu0", b"pids/vm/vcpu0"], files=(b"tasks",))
+        for hierarchy in [b"cpu", b"pids"]:
+            with open(os.path.join(root, hierarchy, b"vm/vcpu0/tasks"), "w") as f:
+                f.write("10\n11\n")
+        tree = Tree(root_path=root)
+        rmdir = os.rmdir
+
+        def cgroupfs_rmdir(path):
+            # Control files do not keep a cgroup from being removed
+            os.remove(os.path.join(path, b"tasks"))
+            return rmdir(path)
+
+        with mock.patch("os.rmdir", side_effect=cgroupfs_rmdir):
+            result = tree.teardown(b"/vm", move_tasks=True)
+
+        self.assertEqual(result.failed, {})
+        self.assertEqual(sorted(result.removed), [b"/cpu/vm", b"/cpu/vm/vcpu0", b"/pids/vm", b"/pids/vm/vcpu0"])
+        for hierarchy in [b"cpu", b"pids"]:
+            with open(os.path.join(root, hierarchy, b"tasks")) as f:
+                self.assertEqual(f.read(), "1011")
+
+    def test_teardown_move_tasks_failure(self):
+        root = tempfile.mkdtemp().encode()
+        self.addCleanup(shutil.rmtree, root)
+        make_hierarchy(root, [b"cpu"], files=(b"tasks",))
+        make_hierarchy(root, [b"cpu/vm", b"pids/vm"], files=(b"tasks",))
+        for hierarchy in [b"cpu", b"pids"]:
+            with open(os.path.join(root, hierarchy, b"vm/tasks"), "w") as f:
+                f.write("10\n")
+        # Writing the tasks of the pids hierarchy fails
+        os.mkdir(os.path.join(root, b"pids/tasks"))
+        tree = Tree(root_path=root)
+        rmdir = os.rmdir
+
+        def cgroupfs_rmdir(path):
+            os.remove(os.path.join(path, b"tasks"))
+            return rmdir(path)
+
+        with mock.patch("os.rmdir", side_effect=cgroupfs_rmdir):
+            result = tree.teardown(b"/vm", move_tasks=True, workers=1)
+
+        self.assertEqual(result.removed, [b"/cpu/vm"])
+        self.assertEqual(list(result.failed), [b"/pids/vm"])
+        self.assertEqual(result.failed[b"/pids/vm"].errno, errno.EISDIR)
+        self.assertIsNotNone(tree.get_node_by_path(b"/pids/vm"))
+
+
+class GroupedTreeTest(BaseTreeTestCase):
+
+    def test_get_node_by_path(self):
+        tree = GroupedTree(root_path=self.root)
+        self.assertIs(tree.get_node_by_path(b"/"), tree.control_root)
+
+        group = tree.get_node_by_path("/machine/vm1.libvirt-qemu/emulator")
+        self.assertEqual(group.name, b"emulator")
+        self.assertEqual(set(group.controllers), {b"cpu", b"memory"})
+        self.assertIsNone(tree.get_node_by_path("/machine/vm1.libvirt-qemu/vcpu1"))
+
+        for walked in tree.walk():
+            self.assertIs(tree.get_node_by_path(walked.path), walked)
+
+    def test_get_nodes_by_name(self):
+        tree = GroupedTree(root_path=self.root)
+        emulator = tree.get_node_by_path(b"/machine/vm1.libvirt-qemu/emulator")
+        self.assertIs(tree.get_node_by_name("vm1"), emulator.parent)
+        self.assertEqual(tree.get_nodes_by_name("emulator", exact=True), [emulator])
+        self.assertEqual(sorted(group.name for group in tree.get_nodes_by_name(".s")),
+                         [b"sshd.service", b"system.slice", b"user.slice"])
+        self.assertIsNone(tree.get_node_by_name("vm2"))
+
+    def test_get_nodes_by_name_walk_order(self):
+        make_hierarchy(self.root, [b"cpu/a/vm-deep", b"cpu/vm-top"])
+        tree = GroupedTree(root_path=self.root)
+        walked = [group for group in tree.walk() if b"vm-" in group.name]
+        self.assertEqual([group.path for group in walked], [b"/a/vm-deep", b"/vm-top"])
+        self.assertIs(tree.get_node_by_name("vm-"), walked[0])
+        self.assertEqual(tree.get_nodes_by_name("vm-"), walked)
+
+    def test_controller_attributes(self):
+        tree = GroupedTree(root_path=self.root)
+        group = tree.get_node_by_path(b"/machine/vm1.libvirt-qemu")
+        self.assertIs(group.cpu, group.controllers[b"cpu"])
+        with self.assertRaises(AttributeError):
+            group.blkio
+
+        group.remove_node(group.cpu.node)
+        self.assertNotIn(b"cpu", group.controllers)
+        with self.assertRaises(AttributeError):
+            group.cpu
+
+        class PidsNode(Node):
+            CONTROLLERS = dict(Node.CONTROLLERS)
+            CONTROLLERS[b"pids"] = Controller
+
+        pids = PidsNode(b"pids", parent=PidsNode(self.root))
+        group.add_node(pids)
+        self.assertIs(group.pids, pids.controller)
+
+    def test_weak_references(self):
+        tree = GroupedTree(root_path=self.root)
+        group = tree.get_node_by_path(b"/machine/vm1.libvirt-qemu")
+        for obj in (group, group.memory, group.memory.node):
+            self.assertIs(weakref.ref(obj)(), obj)
+
+    def test_vm_tree(self):
+        tree = VMTree(root_path=self.root)
+        vm = tree.get_vm_node("vm1")
+        self.assertIs(tree.get_node_by_path("/machine/vm1.libvirt-qemu"), vm)
+        self.assertEqual(vm.emulator.name, b"emulator")
+
+    def test_lazy(self):
+        tree = VMTree(root_path=self.root, lazy=True)
+        self.assertFalse(tree.control_root.children_loaded)
+
+        emulator = tree.get_node_by_path(b"/machine/vm1.libvirt-qemu/emulator")
+        self.assertEqual(set(emulator.controllers), {b"cpu", b"memory"})
+        self.assertFalse(tree.get_node_by_path(b"/user").children_loaded)
+        self.assertIsNone(tree.get_node_by_path(b"/machine/vm2"))
+
+        lazy = VMTree(root_path=self.root, lazy=True)
+        self.assertEqual(lazy.get_vm_node("vm1").path, b"/machine/vm1.libvirt-qemu")
+        self.assertEqual(len(lazy.get_nodes_by_name("emulator")), 1)
+
+    def test_refresh(self):
+        tree = VMTree(root_path=self.root)
+        make_hierarchy(self.root, [b"cpu/machine/vm2.libvirt-qemu/emulator", b"memory/machine/vm2.libvirt-qemu"])
+        shutil.rmtree(os.path.join(self.root, b"cpu/machine/vm1.libvirt-qemu"))
+        added, removed = tree.refresh(check_mtime=False)
+
+        self.assertEqual(sorted(group.path for group in added),
+                         [b"/machine/vm2.libvirt-qemu", b"/machine/vm2.libvirt-qemu/emulator"])
+        self.assertEqual([group.path for group in removed], [b"/machine/vm1.libvirt-qemu/vcpu0"])
+        self.assertEqual(set(tree.get_node_by_path(b"/machine/vm2.libvirt-qemu").controllers), {b"cpu", b"memory"})
+        self.assertEqual(set(tree.vms), {"vm1.libvirt-qemu", "vm2.libvirt-qemu"})
+
+        vm1 = tree.get_vm_node("vm1")
+        self.assertEqual(set(vm1.controllers), {b"memory"})
+        self.assertFalse(hasattr(vm1, "cpu"))
+
+        shutil.rmtree(os.path.join(self.root, b"memory/machine/vm1.libvirt-qemu"))
+        added, removed = tree.refresh(check_mtime=False)
+        self.assertEqual(added, [])
+        self.assertEqual(sorted(group.path for group in removed),
+                         [b"/machine/vm1.libvirt-qemu", b"/machine/vm1.libvirt-qemu/emulator"])
+        self.assertIsNone(tree.get_vm_node("vm1"))
+        self.assertIsNone(tree.get_node_by_path(b"/machine/vm1.libvirt-qemu/emulator"))
+        self.assertEqual(tree.get_nodes_by_name("vm1"), [])
+
+    def test_snapshot(self):
+        snapshot = os.path.join(self.root, b"snapshot")
+        VMTree(root_path=self.root).save(snapshot)
+        make_hierarchy(self.root, [b"cpu/machine/vm2.libvirt-qemu/emulator"])
+
+        tree = VMTree.load(snapshot)
+        self.assertEqual(set(tree.vms), {"vm1.libvirt-qemu", "vm2.libvirt-qemu"})
+        self.assertEqual(set(tree.get_vm_node("vm1").controllers), {b"cpu", b"memory"})
+        self.assertEqual(sorted(group.path for group in tree.walk()),
+                         sorted(group.path for group in VMTree(root_path=self.root).walk()))
+
+    def test_from_tree(self):
+        node_tree = Tree(root_path=self.root)
+        with mock.patch.object(BaseTree, "get_children_paths") as get_children_paths:
+            tree = VMTree.from_tree(node_tree)
+        self.assertFalse(get_children_paths.called)
+
+        self.assertIs(tree.node_tree, node_tree)
+        emulator = tree.get_node_by_path(b"/machine/vm1.libvirt-qemu/emulator")
+        self.assertIs(emulator.cpu.node, node_tree.get_node_by_path(b"/cpu/machine/vm1.libvirt-qemu/emulator"))
+        self.assertEqual(list(tree.vms), ["vm1.libvirt-qemu"])
+        self.assertEqual([group.path for group in tree.walk()],
+                         [group.path for group in VMTree(root_path=self.root).walk()])
+
+    @skipIf(ThreadPoolExecutor is None, "concurrent.futures is not available")
+    def test_collect(self):
+        with open(os.path.join(self.root, b"memory/system.slice/sshd.service/memory.usage_in_bytes"), "w") as f:
+            f.write("4096\n")
+        tree = GroupedTree(root_path=self.root)
+        result = tree.collect(b"memory", ["usage_in_bytes"], workers=2, default=0)
+        self.assertEqual(result, {
+            b"/": {"usage_in_bytes": 0},
+            b"/machine": {"usage_in_bytes": 0},
+            b"/machine/vm1.libvirt-qemu": {"usage_in_bytes": 0},
+            b"/machine/vm1.libvirt-qemu/emulator": {"usage_in_bytes": 0},
+            b"/system": {"usage_in_bytes": 0},
+            b"/system/sshd.service": {"usage_in_bytes": 4096},
+        })
+
+    def test_provision(self):
+        tree = VMTree(root_path=self.root)
+        created = tree.provision({
+            b"/machine/vm2.libvirt-qemu": {"cpu": {"shares": 2048}, "memory": {}},
+            b"/machine/vm2.libvirt-qemu/vcpu0": {"cpu": {}},
+        })
+        self.assertEqual([group.path for group in created], [
+            b"/machine/vm2.libvirt-qemu",
+            b"/machine/vm2.libvirt-qemu/vcpu0",
+        ])
+        vm = tree.get_vm_node("vm2")
+        self.assertIs(vm, created[0])
+        self.assertEqual(set(vm.controllers), {b"cpu", b"memory"})
+        self.assertEqual(vm.cpu.shares, 2048)
+        self.assertEqual(sorted(group.path for group in tree.walk()),
+                         sorted(group.path for group in VMTree(root_path=self.root).walk()))
+
+    def test_provision_failure(self):
+        tree = VMTree(root_path=self.root)
+        spec = {b"/machine/vm9.libvirt-qemu": {"cpu": {"shares": 2048}, "memory": {"limit_in_bytes": 4096}}}
+        original = Controller.set_property
+
+        def set_property(controller, filename, value):
+            if filename == b"memory.limit_in_bytes":
+                raise IOError(errno.EINVAL, "Invalid argument")
+            return original(controller, filename, value)
+
+        with mock.patch.object(Controller, "set_property", autospec=True, side_effect=set_property):
+            with self.assertRaises(TransactionError):
+                tree.provision(spec)
+
+        # The cgroups are kept, and so are their groups
+        vm = tree.get_node_by_path(b"/machine/vm9.libvirt-qemu")
+        self.assertIsNotNone(vm)
+        self.assertIs(tree.get_vm_node("vm9"), vm)
+        self.assertEqual(tree.get_nodes_by_name("vm9"), [vm])
+        self.assertEqual(set(vm.controllers), {b"cpu", b"memory"})
+        self.assertEqual(tree.refresh(), ([], []))
+
+        self.assertEqual(tree.provision(spec), [])
+        self.assertEqual(vm.memory.limit_in_bytes, 4096)
+
+    def test_teardown(self):
+        tree = VMTree(root_path=self.root)
+        rmdir = os.rmdir
+
+        def cgroupfs_rmdir(path):
+            # Control files do not keep a cgroup from being removed
+            for filename in os.listdir(path):
+                os.remove(os.path.join(path, filename))
+            return rmdir(path)
+
+        with mock.patch("os.rmdir", side_effect=cgroupfs_rmdir):
+            result = tree.teardown(b"/machine/vm1.libvirt-qemu")
+
+        self.assertEqual(sorted(result.removed), [
+            b"/cpu/machine/vm1.libvirt-qemu",
+            b"/cpu/machine/vm1.libvirt-qemu/emulator",
+            b"/cpu/machine/vm1.libvirt-qemu/vcpu0",
+            b"/memory/machine/vm1.libvirt-qemu",
+            b"/memory/machine/vm1.libvirt-qemu/emulator",
+        ])
+        self.assertEqual(tree.vms, {})
+        self.assertIsNone(tree.get_node_by_path(b"/machine/vm1.libvirt-qemu"))
+        self.assertEqual(sorted(group.path for group in tree.walk()),
+                         sorted(group.path for group in VMTree(root_path=self.root).walk()))
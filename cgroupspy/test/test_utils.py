@@ -24,7 +24,15 @@ ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
-from cgroupspy.utils import split_path_components
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import skipIf
+
+from cgroupspy.utils import split_path_components, iter_subdirectories, walk_tree, walk_up_tree, NameIndex
+from cgroupspy.utils import collect_values, ThreadPoolExecutor
 
 
 def check__split_path_components_case(path, components):
@@ -45,3 +53,114 @@ def test_split_path_components():
 
     for path, components in pairs:
         yield check__split_path_components_case, path, components
+
+
+def test_name_index():
+    index = NameIndex()
+    first, second, third = object(), object(), object()
+    index.add(b"1ce10f47-fb4e.libvirt-qemu", first)
+    index.add(b"emulator", second)
+    index.add(b"3d5013b9-93ed.libvirt-qemu", third)
+
+    assert len(index) == 3
+    assert index.exact(b"emulator") == [second]
+    assert index.exact(b"emul") == []
+    assert index.search(b"libvirt") == [first, third]
+    assert index.search(b"fb4e") == [first]
+    assert index.search(b"e") == [first, second, third]
+    assert index.search(b"nomatch") == []
+
+    index.remove(b"1ce10f47-fb4e.libvirt-qemu", first)
+    assert index.search(b"libvirt") == [third]
+    assert index.search(b"fb4e") == []
+    assert len(index) == 2
+
+
+def test_iter_subdirectories():
+    root = tempfile.mkdtemp().encode()
+    try:
+        os.mkdir(os.path.join(root, b"cpu,cpuacct"))
+        os.symlink(b"cpu,cpuacct", os.path.join(root, b"cpu"))
+        open(os.path.join(root, b"tasks"), "w").close()
+        assert sorted(iter_subdirectories(root)) == [b"cpu", b"cpu,cpuacct"]
+    finally:
+        shutil.rmtree(root)
+
+
+class Item(object):
+    def __init__(self, name, *children):
+        self.name = name
+        self.children = list(children)
+
+
+def names(nodes):
+    return [node.name for node in nodes]
+
+
+def test_walk_tree():
+    tree = Item("a", Item("b", Item("c"), Item("d")), Item("e", Item("f", Item("g"))))
+
+    assert names(walk_tree(tree)) == ["a", "b", "c", "d", "e", "f", "g"]
+    assert names(walk_tree(tree, max_depth=1)) == ["a", "b", "e"]
+    assert names(walk_tree(tree, prune=lambda node: node.name == "b")) == ["a", "b", "e", "f", "g"]
+    assert names(walk_tree(tree, prune=lambda node: node.name == "e", max_depth=2)) == ["a", "b", "c", "d", "e"]
+
+    assert names(walk_up_tree(tree)) == ["c", "d", "b", "g", "f", "e", "a"]
+    assert names(walk_up_tree(tree, max_depth=1)) == ["b", "e", "a"]
+    assert names(walk_up_tree(tree, prune=lambda node: node.name == "f")) == ["c", "d", "b", "f", "e", "a"]
+
+
+def test_walk_tree_deep():
+    root = node = Item(0)
+    for depth in range(1, 5000):
+        child = Item(depth)
+        node.children.append(child)
+        node = child
+
+    assert len(list(walk_tree(root))) == 5000
+    assert names(walk_up_tree(root))[:2] == [4999, 4998]
+
+
+class SlowController(object):
+    def __init__(self, values, release=None):
+        self.values = values
+        self.release = release
+
+    def snapshot(self, keys):
+        if self.release is not None:
+            self.release.wait()
+        return dict((key, self.values[key]) for key in keys if key in self.values)
+
+
+@skipIf(ThreadPoolExecutor is None, "concurrent.futures is not available")
+def test_collect_values():
+    controllers = [(name, SlowController({"a": i})) for i, name in enumerate("xyz")]
+    expected = {"x": {"a": 0, "b": -1}, "y": {"a": 1, "b": -1}, "z": {"a": 2, "b": -1}}
+    assert collect_values(controllers, ["a", "b"], default=-1) == expected
+    assert collect_values(controllers, ["a", "b"], workers=2, default=-1) == expected
+
+
+@skipIf(ThreadPoolExecutor is None, "concurrent.futures is not available")
+def test_collect_values_timeout():
+    release = threading.Event()
+    controllers = [("stuck", SlowController({"a": 1}, release)), ("fine", SlowController({"a": 2}))]
+    try:
+        result = collect_values(controllers, ["a"], workers=2, timeout=0.05)
+    finally:
+        release.set()
+    assert result == {"stuck": {"a": None}, "fine": {"a": 2}}
+
+
+@skipIf(ThreadPoolExecutor is None, "concurrent.futures is not available")
+def test_collect_values_timeout_queued():
+    # Every worker is stuck, so the reads queued behind them never start
+    release = threading.Event()
+    controllers = [(name, SlowController({"a": 1}, release)) for name in ("stuck1", "stuck2")]
+    controllers += [(name, SlowController({"a": 2})) for name in ("queued1", "queued2", "queued3")]
+    start = time.time()
+    try:
+        result = collect_values(controllers, ["a"], workers=2, timeout=0.05)
+    finally:
+        release.set()
+    assert time.time() - start < 1
+    assert result == dict((name, {"a": None}) for name, _ in controllers)
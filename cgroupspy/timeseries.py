@@ -0,0 +1,169 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+History of per-CPU usage in numpy arrays. numpy is an optional dependency: pip install cgroupspy[numpy]
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .controllers import UNREADABLE_ERRNOS
+from .utils import monotonic, get_node_controller
+
+
+class PerCpuUsageStore(object):
+
+    """
+    A ring buffer of cpuacct.usage_percpu samples for many cgroups, kept in a single int64 array of
+    cgroup x time x CPU. Samples are parsed straight into the array, and the queries work on whole arrays.
+
+    Every record() is one tick, shared by all the cgroups. A cgroup missing from a tick gets -1 for it, which the
+    queries skip.
+
+    >>> store = PerCpuUsageStore(ncpus=96, capacity=60)
+    >>> store.record(vm_nodes)
+    >>> store.record(vm_nodes)
+    >>> store.top(10)
+    [(b'/machine/vm7.libvirt-qemu', 3.9e9), ...]
+    """
+
+    def __init__(self, ncpus, capacity=60):
+        """
+        :param ncpus: int -> Number of CPUs kept per sample. Longer samples are cut, shorter ones padded with -1.
+        :param capacity: int -> Number of ticks kept
+        """
+        if numpy is None:
+            raise RuntimeError("PerCpuUsageStore requires numpy (pip install cgroupspy[numpy])")
+
+        self.ncpus = ncpus
+        self.capacity = capacity
+        self.paths = []
+        self._index = {}
+        self._values = numpy.full((16, capacity, ncpus), -1, dtype=numpy.int64)
+        self._times = numpy.full(capacity, numpy.nan)
+        self._position = -1
+        self.ticks = 0
+
+    def _row(self, path):
+        row = self._index.get(path)
+        if row is None:
+            row = self._index[path] = len(self.paths)
+            self.paths.append(path)
+            if row == len(self._values):
+                grown = numpy.full((row * 2, self.capacity, self.ncpus), -1, dtype=numpy.int64)
+                grown[:row] = self._values
+                self._values = grown
+        return row
+
+    def record(self, nodes, timestamp=None):
+        """
+        Read cpuacct.usage_percpu of the nodes as a new tick, overwriting the oldest one once the store is full.
+
+        :param nodes: list -> Nodes or NodeControlGroups with a cpuacct controller
+        :param timestamp: None | float -> Time of the tick in seconds, by default the monotonic clock
+        """
+        position = (self._position + 1) % self.capacity
+        self._values[:, position, :] = -1
+
+        for node in nodes:
+            controller = get_node_controller(node, b"cpuacct")
+            if controller is None:
+                continue
+            try:
+                content = controller.get_property(b"cpuacct.usage_percpu")
+            except IOError as e:
+                if e.errno in UNREADABLE_ERRNOS:
+                    continue
+                raise
+
+            usage = numpy.fromstring(content, dtype=numpy.int64, sep=" ")[:self.ncpus]
+            self._values[self._row(node.path), position, :len(usage)] = usage
+
+        self._times[position] = monotonic() if timestamp is None else timestamp
+        self._position = position
+        self.ticks += 1
+
+    def _positions(self, count):
+        """Positions of the last count ticks, oldest first"""
+        return (self._position - numpy.arange(count)[::-1]) % self.capacity
+
+    def history(self, path):
+        """
+        The samples of a cgroup, oldest first.
+
+        :return: (numpy.ndarray, numpy.ndarray) -> Tick times, and a time x CPU int64 array with -1 for the gaps
+        """
+        positions = self._positions(min(self.ticks, self.capacity))
+        return self._times[positions], self._values[self._index[path]][positions]
+
+    def rates(self, interval=1):
+        """
+        Per-CPU usage rates between the last tick and the one interval ticks before, in nanoseconds per second.
+
+        :return: numpy.ndarray -> cgroup x CPU float64 array in the order of self.paths, NaN where unknown
+        """
+        if not 0 < interval < self.capacity:
+            raise ValueError("Interval must be between 1 and {}".format(self.capacity - 1))
+
+        count = len(self.paths)
+        if self.ticks <= interval:
+            return numpy.full((count, self.ncpus), numpy.nan)
+
+        current, previous = self._position, (self._position - interval) % self.capacity
+        current_values = self._values[:count, current, :]
+        previous_values = self._values[:count, previous, :]
+        delta = (current_values - previous_values).astype(numpy.float64)
+        # Gaps, and counters that went backwards because the cgroup was recreated
+        delta[(current_values < 0) | (previous_values < 0) | (delta < 0)] = numpy.nan
+        return delta / (self._times[current] - self._times[previous])
+
+    def sums(self, cpus=None, interval=1):
+        """
+        Usage rate of every cgroup summed over a set of CPUs, e.g. a cpuset.cpus value, or all of them.
+
+        :return: numpy.ndarray -> float64 array in the order of self.paths, NaN for cgroups without any rate
+        """
+        rates = self.rates(interval)
+        if cpus is not None:
+            rates = rates[:, sorted(cpus)]
+        known = ~numpy.isnan(rates).all(axis=1)
+        sums = numpy.full(len(rates), numpy.nan)
+        sums[known] = numpy.nansum(rates[known], axis=1)
+        return sums
+
+    def top(self, n, cpus=None, interval=1):
+        """
+        The n cgroups using the most CPU, over a set of CPUs or all of them.
+
+        :return: list -> (path, rate) pairs, highest rate first
+        """
+        sums = self.sums(cpus, interval)
+        known = numpy.flatnonzero(~numpy.isnan(sums))
+        if n < len(known):
+            known = known[numpy.argpartition(-sums[known], n - 1)[:n]]
+        order = known[numpy.argsort(-sums[known], kind="stable")]
+        return [(self.paths[row], float(sums[row])) for row in order]
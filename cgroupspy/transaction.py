@@ -0,0 +1,190 @@
+"""
+Copyright (c) 2014, CloudSigma AG
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the CloudSigma AG nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CLOUDSIGMA AG BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+from collections import OrderedDict
+
+from .controllers import UNREADABLE_ERRNOS
+from .interfaces import IntegerFile, CommaDashSetFile
+
+
+class TransactionError(RuntimeError):
+
+    """
+    A write of a transaction failed. The writes applied before it were rolled back, except for the ones listed in
+    rollback_errors.
+    """
+
+    def __init__(self, write, error, rollback_errors):
+        self.write = write
+        self.error = error
+        self.rollback_errors = rollback_errors
+        controller, key, _ = write
+        super(TransactionError, self).__init__("Writing {} of {} failed: {}{}".format(
+            key, controller.node.full_path, error,
+            " ({} writes could not be rolled back)".format(len(rollback_errors)) if rollback_errors else ""))
+
+
+# The previous value of a write that was not read yet
+_UNREAD = object()
+
+
+class _Write(object):
+    __slots__ = ("controller", "key", "interface", "value", "previous", "grows", "depth")
+
+    def __init__(self, controller, key, interface, value, previous=_UNREAD):
+        self.controller = controller
+        self.key = key
+        self.interface = interface
+        self.value = value
+        self.previous = previous
+        self.grows = True
+        self.depth = controller.node.full_path.rstrip(b"/").count(b"/")
+
+
+# Within a node, memory.limit_in_bytes may never exceed memory.memsw.limit_in_bytes: lower the limit before memsw,
+# and raise memsw before the limit.
+_SHRINK_FIRST = {"limit_in_bytes": 0, "memsw_limit_in_bytes": 1}
+_GROW_FIRST = {"memsw_limit_in_bytes": 0, "limit_in_bytes": 1}
+
+
+class Transaction(object):
+
+    """
+    Queues writes to the interfaces of any number of controllers and applies them together, in an order the kernel
+    accepts, restoring the previous values if a write fails.
+
+    >>> with Transaction() as tx:
+    ...     tx.set(vm.memory, "limit_in_bytes", 2 * 2 ** 30)
+    ...     tx.set(vm.memory, "memsw_limit_in_bytes", 3 * 2 ** 30)
+    ...     tx.set(vm.cpuset, "cpus", {0, 1})
+    ...     for vcpu in vm.children:
+    ...         tx.set(vcpu.cpuset, "cpus", {0, 1})
+
+    Limits that go down are written first, deepest cgroups first, then the ones that go up, parents first, so that
+    a child never exceeds its parent's cpuset or CFS quota. Repeated writes to a file are coalesced and writes of
+    the value a file already holds are skipped.
+    """
+
+    def __init__(self):
+        self._writes = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, controller, key, value, previous=_UNREAD):
+        """
+        Queue a write of an interface, the same as controller.<key> = value. The value is validated right away.
+
+        :param previous: None | str -> The content of the file, if the caller already read it, so commit() does not
+            read it again. None if the file cannot be read.
+        """
+        interface = controller.get_interface(key)
+        if interface is None:
+            raise AttributeError("{} has no interface {}".format(controller.__class__.__name__, key))
+        if interface.readonly:
+            raise RuntimeError("This interface is readonly")
+
+        value = interface.sanitize_set(value)
+        path = controller.filepath(interface.filename)
+        self._writes.pop(path, None)
+        if value is not None:
+            self._writes[path] = _Write(controller, key, interface, value, previous)
+
+    def _plan(self):
+        """Read the current values and order the writes. Writes that would change nothing are dropped."""
+        shrinking, growing = [], []
+        for write in self._writes.values():
+            interface = write.interface
+            if write.previous is _UNREAD:
+                write.previous = None
+                if not interface.writeonly:
+                    try:
+                        write.previous = write.controller.get_property(interface.filename)
+                    except IOError as e:
+                        if e.errno not in UNREADABLE_ERRNOS:
+                            raise
+
+            previous = write.previous
+            if previous is not None:
+                previous = previous.strip()
+                if previous == str(write.value):
+                    continue
+                if previous:
+                    write.grows = _grows(interface, interface.sanitize_get(previous), write.value)
+            (growing if write.grows else shrinking).append(write)
+
+        shrinking.sort(key=lambda write: (-write.depth, _SHRINK_FIRST.get(write.key, 0)))
+        growing.sort(key=lambda write: (write.depth, _GROW_FIRST.get(write.key, 0)))
+        return shrinking + growing
+
+    def commit(self):
+        """
+        Apply the queued writes. If one fails, the applied ones are restored in reverse order and TransactionError is
+        raised. Files that cannot be read, like devices.allow, cannot be restored.
+
+        :return: int -> The number of writes applied
+        """
+        writes = self._plan()
+        self._writes.clear()
+
+        applied = []
+        for write in writes:
+            try:
+                write.controller.set_property(write.interface.filename, write.value)
+            except (IOError, OSError) as e:
+                raise TransactionError((write.controller, write.key, write.value), e, self._rollback(applied))
+            applied.append(write)
+        return len(applied)
+
+    def _rollback(self, applied):
+        errors = []
+        for write in reversed(applied):
+            if write.previous is None:
+                errors.append(((write.controller, write.key, write.value), None))
+                continue
+            try:
+                write.controller.set_property(write.interface.filename, write.previous.strip())
+            except (IOError, OSError) as e:
+                errors.append(((write.controller, write.key, write.value), e))
+        return errors
+
+
+def _grows(interface, previous, value):
+    """Whether a write raises a limit - any write that does not lower one counts"""
+    if isinstance(interface, IntegerFile):
+        previous = float("inf") if previous is None or previous < 0 else previous
+        value = int(value)
+        return value < 0 or value >= previous
+    if isinstance(interface, CommaDashSetFile):
+        return interface.sanitize_get(str(value)) >= (previous or set())
+    return True
@@ -24,17 +24,36 @@ ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
+import errno
 import os
+import time
+from collections import namedtuple, OrderedDict
 
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+from .fileio import read_file
+from .migration import migrate
 from .nodes import Node, NodeControlGroup, NodeVM
-from .utils import walk_tree, walk_up_tree, split_path_components
+from .snapshots import dump_nodes, load_nodes
+from .transaction import Transaction
+from .utils import walk_tree, walk_up_tree, walk_loaded_tree, split_path_components, iter_subdirectories, get_mtime, NameIndex
+from .utils import collect_values
+
+
+TreeChanges = namedtuple("TreeChanges", ["added", "removed"])
+
+# removed: the paths of the removed cgroups; failed: {path: the OSError, or other error, that kept it from being removed}
+TeardownResult = namedtuple("TeardownResult", ["removed", "failed"])
 
 
 class BaseTree(object):
 
     """ A basic cgroup node tree. An exact representation of the filesystem tree, provided by cgroups. """
 
-    def __init__(self, root_path=b"/sys/fs/cgroup/", groups=None, sub_groups=None):
+    def __init__(self, root_path=b"/sys/fs/cgroup/", groups=None, sub_groups=None, lazy=False, workers=None):
         """
         Construct a basic cgroup node tree. An exact representation of the filesystem tree, provided by cgroups.
 
@@ -42,16 +61,51 @@ class BaseTree(object):
         :param groups: None | list -> Use only those controllers to collect information in this tree instance
         :param sub_groups: None | list -> Use only those slices to retrieve information. If the slice does not exist,
                                           then create it
+        :param lazy: bool -> Only create the controller nodes (and the sub-groups) up front. Every other node's
+                             children are read from the filesystem on first access.
+        :param workers: None | int -> Build the controller hierarchies in a pool of that many threads. The result is
+                                      the same as a serial build.
         """
         if isinstance(root_path, str):
             root_path = root_path.encode()
+        if workers and workers > 1 and ThreadPoolExecutor is None:
+            raise RuntimeError("Building with workers requires concurrent.futures (the futures package on Python 2)")
 
         self.root_path = root_path
+        self.lazy = lazy
+        self.workers = workers
         self._groups = groups or []
         self._sub_groups = sub_groups or []
         self.root = Node(root_path)
         self._build_tree()
 
+    @classmethod
+    def load(cls, path, refresh=True):
+        """
+        Create a tree from a snapshot saved with save(), without walking the cgroup filesystem.
+
+        :param path: str -> The snapshot file
+        :param refresh: bool -> Re-read the directories whose mtime changed since the snapshot was taken
+        """
+        root, header = load_nodes(path)
+
+        tree = cls.__new__(cls)
+        tree.root_path = header["root_path"]
+        tree.lazy = header["lazy"]
+        tree.workers = None
+        tree._groups = header["groups"]
+        tree._sub_groups = header["sub_groups"]
+        tree.root = root
+        if refresh:
+            tree.refresh()
+        return tree
+
+    def save(self, path):
+        """
+        Save the tree's structure to a snapshot file, to be restored with load().
+        """
+        dump_nodes(path, self.root, self.root_path, groups=self._groups, sub_groups=self._sub_groups, lazy=self.lazy)
+
     @property
     def groups(self):
         return self._groups
@@ -65,20 +119,26 @@ class BaseTree(object):
         Build a full or a partial tree, depending on the groups/sub-groups specified.
         """
 
-        groups = self._groups or self.get_children_paths(self.root_path)
-        for group in groups:
-            node = Node(name=group, parent=self.root)
-            self.root.children.append(node)
-            self._init_sub_groups(node)
+        groups = self._groups
+        if not groups:
+            self.root.mtime = get_mtime(self.root_path)
+            groups = self.get_children_paths(self.root_path)
+
+        sub_group_components = self._parse_sub_groups()
+        nodes = [self.root.add_child(Node(name=group, parent=self.root, lazy=self.lazy)) for group in groups]
+
+        if self.workers and self.workers > 1 and len(nodes) > 1:
+            # Every controller hierarchy is built under its own node, so the threads never share a parent
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(lambda node: self._init_sub_groups(node, sub_group_components), nodes))
+        else:
+            for node in nodes:
+                self._init_sub_groups(node, sub_group_components)
 
-    def _init_sub_groups(self, parent):
+    def _parse_sub_groups(self):
         """
-        Initialise sub-groups, and create any that do not already exist.
+        Returns a dict of the sub-groups to their path components, leaving out empty sub-groups.
         """
-        if not self._sub_groups:
-            self._init_children(parent)
-            return
-
         sub_group_components = dict()
 
         for sub_group in self._sub_groups:
@@ -92,53 +152,345 @@ class BaseTree(object):
 
             sub_group_components[sub_group] = components
 
-        self._sub_groups = list(sub_group_components.keys())
-        if not self._sub_groups:
+        if self._sub_groups:
+            self._sub_groups = list(sub_group_components.keys())
+        return sub_group_components
+
+    def _init_sub_groups(self, parent, sub_group_components):
+        """
+        Initialise sub-groups, and create any that do not already exist.
+        """
+        if not sub_group_components:
             self._init_children(parent)
             return
 
         for sub_group, components in sub_group_components.items():
+            node = parent
             for component in components:
                 if isinstance(component, str):
                     component = component.encode()
 
-                fp = os.path.join(parent.full_path, component)
+                fp = os.path.join(node.full_path, component)
                 if os.path.exists(fp):
-                    node = Node(name=component, parent=parent)
-                    parent.children.append(node)
+                    node = node.get_child(component) or node.add_child(
+                        Node(name=component, parent=node, lazy=self.lazy))
                 else:
-                    node = parent.create_cgroup(component)
-                parent = node
+                    node = node.create_cgroup(component)
             self._init_children(node)
 
     def _init_children(self, parent):
         """
-        Initialise each node's children - essentially build the tree.
+        Initialise each node's children - essentially build the tree. Lazy nodes are left to load their own.
         """
+        if not parent.children_loaded:
+            return
 
+        parent.mtime = get_mtime(parent.full_path)
         for dir_name in self.get_children_paths(parent.full_path):
-            child = Node(name=dir_name, parent=parent)
-            parent.children.append(child)
+            child = parent.add_child(Node(name=dir_name, parent=parent))
             self._init_children(child)
 
     def get_children_paths(self, parent_full_path):
-        for dir_name in os.listdir(parent_full_path):
-            if os.path.isdir(os.path.join(parent_full_path, dir_name)):
-                yield dir_name
+        return iter_subdirectories(parent_full_path)
+
+    def refresh(self, check_mtime=True):
+        """
+        Bring the tree in line with the filesystem, by re-reading the directories whose mtime changed since their
+        children were last read. Nodes are patched in place. Nodes whose children were never read (lazy or partial,
+        e.g. the parents of sub-groups) are not re-read.
 
-    def walk(self, root=None):
-        """Walk through each each node - pre-order depth-first"""
+        :param check_mtime: bool -> Re-read every directory, for filesystems that do not update directory mtimes
+        :return: TreeChanges -> The added and the removed nodes, each subtree in pre-order
+        """
+        added = []
+        removed = []
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not node.children_loaded:
+                continue
+
+            new_children = []
+            if node.mtime is not None:
+                try:
+                    mtime = get_mtime(node.full_path)
+                except OSError as e:
+                    if e.errno != errno.ENOENT or node.parent is None:
+                        raise
+                    removed.extend(walk_loaded_tree(node))
+                    node.parent.remove_child(node)
+                    continue
+
+                if mtime != node.mtime or not check_mtime:
+                    new_children, gone = self._refresh_children(node, mtime)
+                    for child in new_children:
+                        added.extend(walk_loaded_tree(child))
+                    for child in gone:
+                        removed.extend(walk_loaded_tree(child))
+
+            new_ids = set(id(child) for child in new_children)
+            stack.extend(reversed([child for child in node.children if id(child) not in new_ids]))
+
+        return TreeChanges(added, removed)
+
+    def _refresh_children(self, node, mtime):
+        """
+        Re-read the children of a node. Returns the children that appeared and the ones that are gone.
+        """
+        node.mtime = mtime
+        names = list(self.get_children_paths(node.full_path))
+        current = set(names)
+
+        gone = [child for child in node.children if child.name not in current]
+        for child in gone:
+            node.remove_child(child)
+
+        existing = set(child.name for child in node.children)
+        new_children = []
+        for name in names:
+            if name in existing:
+                continue
+            child = node.add_child(Node(name=name, parent=node, lazy=self.lazy))
+            self._init_children(child)
+            new_children.append(child)
+
+        return new_children, gone
+
+    def walk(self, root=None, prune=None, max_depth=None):
+        """Walk through each each node - pre-order depth-first. See utils.walk_tree"""
 
         if root is None:
             root = self.root
-        return walk_tree(root)
+        return walk_tree(root, prune=prune, max_depth=max_depth)
 
-    def walk_up(self, root=None):
-        """Walk through each each node - post-order depth-first"""
+    def walk_up(self, root=None, prune=None, max_depth=None):
+        """Walk through each each node - post-order depth-first. See utils.walk_up_tree"""
 
         if root is None:
             root = self.root
-        return walk_up_tree(root)
+        return walk_up_tree(root, prune=prune, max_depth=max_depth)
+
+    def collect(self, controller, keys, workers=None, timeout=None, default=None, root=None):
+        """
+        Read interfaces of one controller type from every node of the tree. See utils.collect_values
+
+        :param controller: str -> Controller type, e.g. "memory"
+        :param keys: list -> Interface names, e.g. ["usage_in_bytes"]
+        :return: dict -> {node path: {interface name: value}}
+        """
+        controller = _controller_type(controller)
+        controllers = ((node.path, node.controller) for node in self.walk(root)
+                       if node.controller is not None and node.controller_type == controller)
+        return collect_values(controllers, keys, workers=workers, timeout=timeout, default=default)
+
+    def provision(self, spec):
+        """
+        Create cgroups and set their initial values in one call. Missing cgroups are created along the whole path,
+        like mkdir -p, and existing ones are kept. The values are written afterwards in a single Transaction, so
+        parents get their cpuset before their children and a failed write rolls the values back. The cgroups
+        created before a failure are kept.
+
+        >>> tree.provision({
+        ...     b"/machine/vm1": {"cpu": {"shares": 2048}, "cpuset": {"cpus": {0, 1}, "mems": {0}}, "memory": {}},
+        ...     b"/machine/vm1/vcpu0": {"cpu": {}, "cpuset": {"cpus": {0}, "mems": {0}}},
+        ... })
+
+        :param spec: dict -> {path: {controller type: {interface name: value}}}, where the path is relative to the
+                             hierarchy roots, e.g. b"/machine/vm1", and is created in every listed hierarchy
+        :return: list -> The created nodes, parents before children
+        """
+        created = []
+        self._provision(spec, created)
+        return created
+
+    def _provision(self, spec, created):
+        """
+        The work of provision. Created nodes are appended to created right away, so a caller still has them when
+        a later mkdir or the transaction fails.
+        """
+        # Check the whole spec before creating anything
+        for controllers in spec.values():
+            for controller_type, values in controllers.items():
+                hierarchy = self.root.get_child(_controller_type(controller_type))
+                if hierarchy is None:
+                    raise ValueError("There is no {} hierarchy in the tree".format(controller_type))
+                if values:
+                    _check_values(hierarchy.CONTROLLERS.get(hierarchy.name), controller_type, values)
+
+        transaction = Transaction()
+        for path in sorted(spec, key=lambda path: len(split_path_components(path))):
+            for controller_type, values in spec[path].items():
+                node = self.root.get_child(_controller_type(controller_type))
+                for component in split_path_components(path):
+                    component = component.encode()
+                    child = node.get_child(component)
+                    if child is None:
+                        child = node.create_cgroup(component)
+                        child.mtime = get_mtime(child.full_path)
+                        created.append(child)
+                    node = child
+
+                for key, value in values.items():
+                    transaction.set(node.controller, key, value)
+
+        transaction.commit()
+
+    def teardown(self, path, controllers=None, move_tasks=False, workers=None, retries=5, delay=0.01):
+        """
+        Remove a cgroup and everything below it, in every controller hierarchy it exists in. Each subtree is removed
+        bottom-up, and the hierarchies are torn down in parallel. A removal that fails with EBUSY, e.g. while the
+        last tasks exit, is retried with exponential backoff. The ancestors of a cgroup that could not be removed
+        are reported with ENOTEMPTY, without trying them.
+
+        :param path: str -> Path relative to the hierarchy roots, e.g. b"/machine/vm1"
+        :param controllers: None | list -> Only these controller hierarchies
+        :param move_tasks: bool -> Move the tasks still in the cgroups to the parent of the subtree first
+        :param workers: None | int -> Number of threads, by default one per hierarchy
+        :param retries: int -> Retries of a removal that fails with EBUSY
+        :param delay: float -> Seconds before the first retry, doubled for every next one
+        :return: TeardownResult
+        """
+        components = [component.encode() for component in split_path_components(path)]
+        if not components:
+            raise ValueError("Cannot tear down the hierarchy roots")
+
+        if controllers is None:
+            hierarchies = list(self.root.children)
+        else:
+            hierarchies = [self.root.get_child(_controller_type(controller)) for controller in controllers]
+
+        nodes = []
+        for node in hierarchies:
+            for component in components:
+                if node is None:
+                    break
+                node = node.get_child(component)
+            if node is not None:
+                nodes.append(node)
+
+        removed, failed = self._teardown_nodes(nodes, move_tasks, workers, retries, delay)
+        return TeardownResult([node.path for node in removed], failed)
+
+    def _teardown_nodes(self, nodes, move_tasks, workers, retries, delay):
+        """Tear down the subtrees of nodes from different hierarchies. Returns the removed nodes and the failures."""
+        def teardown(node):
+            return self._teardown_subtree(node, move_tasks, retries, delay)
+
+        if len(nodes) > 1 and workers != 1 and ThreadPoolExecutor is not None:
+            # The subtrees are in different hierarchies, so the threads never share a parent
+            with ThreadPoolExecutor(max_workers=workers or len(nodes)) as executor:
+                results = list(executor.map(teardown, nodes))
+        else:
+            results = [teardown(node) for node in nodes]
+
+        removed = []
+        failed = OrderedDict()
+        for subtree_removed, subtree_failed in results:
+            removed.extend(subtree_removed)
+            failed.update(subtree_failed)
+        return removed, failed
+
+    def _teardown_subtree(self, root, move_tasks, retries, delay):
+        target = root.parent
+        removed = []
+        failed = OrderedDict()
+        blocked = set()
+        for node in walk_up_tree(root):
+            if id(node) in blocked:
+                failed[node.path] = OSError(errno.ENOTEMPTY, "A child cgroup could not be removed", node.full_path)
+                blocked.add(id(node.parent))
+                continue
+
+            error = _remove_cgroup(node, target if move_tasks else None, retries, delay)
+            if error is None:
+                removed.append(node)
+            else:
+                failed[node.path] = error
+                blocked.add(id(node.parent))
+
+        if not failed:
+            target.remove_child(root)
+            return removed, failed
+
+        # Detach the removed nodes whose parents are still there, once per parent
+        removed_ids = set(id(node) for node in removed)
+        by_parent = OrderedDict()
+        for node in removed:
+            if id(node.parent) not in removed_ids:
+                by_parent.setdefault(id(node.parent), (node.parent, []))[1].append(node)
+        for parent, children in by_parent.values():
+            parent.remove_children(children)
+        return removed, failed
+
+
+def _check_values(controller_class, controller_type, values):
+    """Raise ValueError unless every value can be written to an interface of the controller class"""
+    if controller_class is None:
+        raise ValueError("There is no controller for {} to set {} with".format(controller_type, ", ".join(values)))
+
+    interfaces = controller_class._interface_map()
+    for key, value in values.items():
+        interface = interfaces.get(key)
+        if interface is None or interface.readonly:
+            raise ValueError("{} has no writable interface {}".format(controller_class.__name__, key))
+        try:
+            interface.sanitize_set(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid {} for {}.{}: {}".format(value, controller_type, key, e))
+
+
+def _preorder_key(positions):
+    """
+    A sort key that orders nodes the way a pre-order walk visits them: the position of each ancestor among its
+    siblings, from the root down. positions caches the child positions of the parents seen so far.
+    """
+    def key(node):
+        indices = []
+        while node.parent is not None:
+            parent = node.parent
+            children = positions.get(id(parent))
+            if children is None:
+                children = positions[id(parent)] = dict((id(child), idx) for idx, child in enumerate(parent.children))
+            indices.append(children[id(node)])
+            node = parent
+        indices.reverse()
+        return indices
+    return key
+
+
+def _remove_cgroup(node, target, retries, delay):
+    """
+    rmdir a cgroup, moving its tasks to target first when given, retrying EBUSY. Returns None or the error.
+    The tasks file is used directly, as hierarchies like pids or freezer have no controller class.
+    """
+    for attempt in range(retries + 1):
+        if target is not None:
+            try:
+                pids = [int(pid) for pid in read_file(os.path.join(node.full_path, b"tasks")).split()]
+                if pids:
+                    migrate(pids, target)
+            except (IOError, OSError) as e:
+                if e.errno != errno.ENOENT:
+                    return e
+            except ValueError as e:
+                return e
+
+        try:
+            os.rmdir(node.full_path)
+            return None
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return None
+            if e.errno != errno.EBUSY or attempt == retries:
+                return e
+        time.sleep(delay * 2 ** attempt)
+
+
+def _controller_type(controller):
+    if not isinstance(controller, bytes):
+        controller = controller.encode()
+    return controller
 
 
 class Tree(BaseTree):
@@ -147,10 +499,18 @@ class Tree(BaseTree):
             path = path.encode()
         except AttributeError:
             pass
-        path = path.rstrip(b"/")
-        for node in self.walk():
-            if node.path == path:
-                return node
+        path = path.rstrip(b"/") or b"/"
+        node = self.root.path_index.get(path)
+        if node is not None or not self.lazy:
+            return node
+
+        # Only read the directories along the path
+        node = self.root
+        for component in split_path_components(path):
+            node = node.get_child(component)
+            if node is None:
+                return None
+        return node
 
 
 class GroupedTree(object):
@@ -161,67 +521,269 @@ class GroupedTree(object):
 
     """
 
-    def __init__(self, root_path=b"/sys/fs/cgroup", groups=None, sub_groups=None):
+    def __init__(self, root_path=b"/sys/fs/cgroup", groups=None, sub_groups=None, lazy=False, workers=None):
+        """
+        :param lazy: bool -> Build the groups level by level, when their children are first accessed. See BaseTree.
+        :param workers: None | int -> Build the controller hierarchies in a thread pool. See BaseTree.
+        """
+        node_tree = BaseTree(root_path=root_path, groups=groups, sub_groups=sub_groups, lazy=lazy, workers=workers)
+        self._init_groups(node_tree)
+
+    @classmethod
+    def load(cls, path, refresh=True):
+        """
+        Create a grouped tree from a snapshot saved with save(). See BaseTree.load
+        """
+        return cls.from_tree(BaseTree.load(path, refresh=refresh))
+
+    @classmethod
+    def from_tree(cls, tree):
+        """
+        Create a grouped tree on top of an existing BaseTree, sharing its nodes instead of walking the filesystem
+        again. The grouped tree inherits the tree's lazy mode. Use the grouped tree's refresh(), which refreshes
+        the shared nodes as well, to keep both up to date.
+        """
+        grouped_tree = cls.__new__(cls)
+        grouped_tree._init_groups(tree)
+        return grouped_tree
+
+    def save(self, path):
+        """
+        Save the structure of the underlying node tree to a snapshot file, to be restored with load().
+        """
+        self.node_tree.save(path)
 
-        self.node_tree = BaseTree(root_path=root_path, groups=groups, sub_groups=sub_groups)
+    def _init_groups(self, node_tree):
+        self.lazy = node_tree.lazy
+        self.name_index = NameIndex()
+        self.node_tree = node_tree
         self.control_root = NodeControlGroup(name=b"cgroup")
+        self.name_index.add(self.control_root.name, self.control_root)
         for ctrl in self.node_tree.root.children:
             self.control_root.add_node(ctrl)
 
         self._init_control_tree(self.control_root)
 
     def _init_control_tree(self, cgroup):
+        """
+        Group the whole node hierarchy below a group, in a single pass over the nodes.
+        """
+        if self.lazy:
+            cgroup.defer_children(self._merge_children)
+            return
+
+        stack = [cgroup]
+        while stack:
+            stack.extend(reversed(self._merge_children(stack.pop())))
+
+    def _merge_children(self, cgroup):
+        """
+        Group the children of all the nodes in a group by name. Returns the newly created groups.
+        """
         new_cgroups = []
+        children_map = cgroup.children_map
         for node in cgroup.nodes:
 
             for child in node.children:
-                if child.name not in cgroup.children_map:
-                    new_cgroup = self._create_node(child.verbose_name, parent=cgroup)
-                    cgroup.children_map[child.name] = new_cgroup
-                    new_cgroups.append(new_cgroup)
+                group = children_map.get(child.name)
+                if group is None:
+                    group = cgroup.add_child(self._create_node(child.verbose_name, parent=cgroup))
+                    self.name_index.add(group.name, group)
+                    if self.lazy:
+                        group.defer_children(self._merge_children)
+                    new_cgroups.append(group)
+
+                group.add_node(child)
+
+        return new_cgroups
+
+    def refresh(self, check_mtime=True):
+        """
+        Refresh the underlying node tree (see BaseTree.refresh) and patch the groups in place. Groups whose children
+        were not built yet are left alone - they pick up the changes when they are.
+
+        :return: TreeChanges -> The groups that were created and the ones that lost all of their nodes
+        """
+        changes = self.node_tree.refresh(check_mtime=check_mtime)
+        removed = self._remove_nodes(changes.removed)
+        return TreeChanges(self._add_nodes(changes.added), removed)
 
-                cgroup.children_map[child.name].add_node(child)
+    def _remove_nodes(self, nodes):
+        """
+        Drop removed nodes of the node tree from their groups, parents before children. Groups left without nodes are
+        detached. Returns the detached groups.
+        """
+        removed = []
+        for node in nodes:
+            group = self._find_group(node)
+            if group is None:
+                continue
+            group.remove_node(node)
+            if not group.nodes and group.parent is not None:
+                for detached in group.parent.remove_child(group):
+                    self._discard_node(detached)
+                    removed.append(detached)
+        return removed
+
+    def _add_nodes(self, nodes):
+        """
+        Add new nodes of the node tree to their groups, parents before children. Returns the groups that were created.
+        """
+        added = []
+        for node in nodes:
+            if node.parent is self.node_tree.root:
+                self.control_root.add_node(node)
+                continue
 
-        for new_group in new_cgroups:
-            self._init_control_tree(new_group)
+            parent = self._find_group(node.parent)
+            if parent is None or not parent.children_loaded:
+                continue
+            group = parent.children_map.get(node.name)
+            if group is None:
+                group = parent.add_child(self._create_node(node.verbose_name, parent=parent))
+                self.name_index.add(group.name, group)
+                if self.lazy:
+                    group.defer_children(self._merge_children)
+                added.append(group)
+            group.add_node(node)
+        return added
+
+    def _find_group(self, node):
+        """
+        Returns the built group holding a node, or None.
+        """
+        names = []
+        while node.parent is not None and node.parent.parent is not None:
+            names.append(node.name)
+            node = node.parent
+
+        group = self.control_root
+        for name in reversed(names):
+            if not group.children_loaded:
+                return None
+            group = group.children_map.get(name)
+            if group is None:
+                return None
+        return group
+
+    def _discard_node(self, group):
+        """Forget a group, detached from the tree"""
+        self.name_index.remove(group.name, group)
+
+    def load_all(self):
+        """Build every group of a lazy tree"""
+        for _ in self.walk():
+            pass
 
     def _create_node(self, name, parent):
         return NodeControlGroup(name, parent=parent)
 
-    def walk(self, root=None):
+    def walk(self, root=None, prune=None, max_depth=None):
+        """Walk through each group - pre-order depth-first. See utils.walk_tree"""
         if root is None:
             root = self.control_root
-        return walk_tree(root)
+        return walk_tree(root, prune=prune, max_depth=max_depth)
 
-    def walk_up(self, root=None):
+    def walk_up(self, root=None, prune=None, max_depth=None):
+        """Walk through each group - post-order depth-first. See utils.walk_up_tree"""
         if root is None:
             root = self.control_root
-        return walk_up_tree(root)
+        return walk_up_tree(root, prune=prune, max_depth=max_depth)
+
+    def collect(self, controller, keys, workers=None, timeout=None, default=None, root=None):
+        """
+        Read interfaces of one controller type from every group that has it. See utils.collect_values
+
+        :param controller: str -> Controller type, e.g. "memory"
+        :param keys: list -> Interface names, e.g. ["usage_in_bytes"]
+        :return: dict -> {group path: {interface name: value}}
+        """
+        controller = _controller_type(controller)
+        controllers = ((group.path, group.controllers[controller]) for group in self.walk(root)
+                       if controller in group.controllers)
+        return collect_values(controllers, keys, workers=workers, timeout=timeout, default=default)
+
+    def provision(self, spec):
+        """
+        Create cgroups and set their initial values in one call, and add them to the groups. See BaseTree.provision.
+        Paths are directory names, with their .slice/.scope/.partition extensions.
+
+        :return: list -> The created groups, parents before children
+        """
+        created = []
+        try:
+            self.node_tree._provision(spec, created)
+        finally:
+            # Cgroups created before a failure are kept, so they join the groups either way
+            groups = self._add_nodes(created)
+        return groups
+
+    def teardown(self, path, move_tasks=False, workers=None, retries=5, delay=0.01):
+        """
+        Remove a group and everything below it, in all of its hierarchies, and drop the groups that lost all of
+        their nodes. See BaseTree.teardown - the reported paths are node paths, e.g. b"/cpu/machine/vm1".
+
+        :param path: str -> The group path, e.g. b"/machine/vm1"
+        :return: TeardownResult
+        """
+        group = self.get_node_by_path(path)
+        if group is None:
+            return TeardownResult([], OrderedDict())
+        if group.parent is None:
+            raise ValueError("Cannot tear down the control root")
+
+        removed, failed = self.node_tree._teardown_nodes(list(group.nodes), move_tasks, workers, retries, delay)
+        # Parents before children, for _remove_nodes
+        self._remove_nodes(reversed(removed))
+        return TeardownResult([node.path for node in removed], failed)
 
     def get_node_by_name(self, pattern):
+        """Returns the first group whose name contains the pattern, in walk() order"""
+        nodes = self._find_by_name(pattern)
+        if nodes:
+            return min(nodes, key=_preorder_key({}))
+
+    def get_nodes_by_name(self, pattern, exact=False):
+        """
+        Returns all groups whose name contains the pattern, or is equal to it if exact is set, in walk() order.
+        A lazy tree is fully built first.
+        """
+        return sorted(self._find_by_name(pattern, exact), key=_preorder_key({}))
+
+    def _find_by_name(self, pattern, exact=False):
         try:
             pattern = pattern.encode()
         except AttributeError:
             pass
-        for node in self.walk():
-            if pattern in node.name:
-                return node
+        if self.lazy:
+            self.load_all()
+        if exact:
+            return self.name_index.exact(pattern)
+        return self.name_index.search(pattern)
 
     def get_node_by_path(self, path):
         try:
             path = path.encode()
         except AttributeError:
             pass
-        for node in self.walk():
-            if path == node.path:
-                return node
+        group = self.control_root.path_index.get(path)
+        if group is not None or not self.lazy:
+            return group
+
+        # Only build the groups along the path
+        group = self.control_root
+        for component in split_path_components(path):
+            group = group.get_child(component)
+            if group is None:
+                return None
+        return group
 
 
 class VMTree(GroupedTree):
 
-    def __init__(self, *args, **kwargs):
+    def _init_groups(self, node_tree):
         self.vms = {}
-        super(VMTree, self).__init__(*args, **kwargs)
+        super(VMTree, self)._init_groups(node_tree)
 
     def _create_node(self, name, parent):
         if b"libvirt-qemu" in name or b"machine-qemu" in name or parent.name == b"qemu":
@@ -234,7 +796,21 @@ class VMTree(GroupedTree):
             return vm_node
         return super(VMTree, self)._create_node(name, parent=parent)
 
+    def _discard_node(self, group):
+        super(VMTree, self)._discard_node(group)
+        key = group.name.decode()
+        if self.vms.get(key) is group:
+            del self.vms[key]
+
     def get_vm_node(self, name):
+        """Returns the VM by name. A lazy tree is fully built if the VM is not among the groups built so far."""
+        vm_node = self._find_vm_node(name)
+        if vm_node is None and self.lazy:
+            self.load_all()
+            vm_node = self._find_vm_node(name)
+        return vm_node
+
+    def _find_vm_node(self, name):
         keys = [
             name,
             '%s.libvirt-qemu' % name,
@@ -24,25 +24,202 @@ ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
+import itertools
 import os
+import time
 
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
-def walk_tree(root):
-    """Pre-order depth-first"""
-    yield root
+try:
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+except ImportError:
+    ThreadPoolExecutor = None
 
-    for child in root.children:
-        for el in walk_tree(child):
-            yield el
+# Falls back to the wall clock on Python 2
+monotonic = getattr(time, "monotonic", time.time)
 
 
-def walk_up_tree(root):
-    """Post-order depth-first"""
-    for child in root.children:
-        for el in walk_up_tree(child):
-            yield el
+def walk_tree(root, prune=None, max_depth=None):
+    """
+    Pre-order depth-first
 
-    yield root
+    :param prune: None | callable -> Called with each node, a true result skips the node's descendants
+    :param max_depth: None | int -> Do not go deeper than that many levels below the root
+    """
+    if max_depth is None:
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            yield node
+            if prune is not None and prune(node):
+                continue
+            children = node.children
+            if children:
+                stack.extend(reversed(children))
+        return
+
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        yield node
+        if depth >= max_depth or (prune is not None and prune(node)):
+            continue
+        depth += 1
+        stack.extend((child, depth) for child in reversed(node.children))
+
+
+def walk_up_tree(root, prune=None, max_depth=None):
+    """
+    Post-order depth-first
+
+    :param prune: None | callable -> Called with each node, a true result skips the node's descendants
+    :param max_depth: None | int -> Do not go deeper than that many levels below the root
+    """
+    stack = [(root, 0, False)]
+    while stack:
+        node, depth, visited = stack.pop()
+        if visited:
+            yield node
+            continue
+
+        stack.append((node, depth, True))
+        if (max_depth is not None and depth >= max_depth) or (prune is not None and prune(node)):
+            continue
+        depth += 1
+        stack.extend((child, depth, False) for child in reversed(node.children))
+
+
+def _not_loaded(node):
+    return not node.children_loaded
+
+
+def walk_loaded_tree(root):
+    """Pre-order depth-first, without reading the children of lazy nodes"""
+    return walk_tree(root, prune=_not_loaded)
+
+
+def iter_subdirectories(path):
+    """
+    Yields the names of the directories directly under path. With scandir the entry type comes from the directory
+    listing itself, so only symlinks (like cpu -> cpu,cpuacct at the cgroup mount root) need a stat call.
+    """
+    if scandir is None:
+        for name in os.listdir(path):
+            if os.path.isdir(os.path.join(path, name)):
+                yield name
+        return
+
+    entries = scandir(path)
+    try:
+        for entry in entries:
+            if entry.is_dir():
+                yield entry.name
+    finally:
+        close = getattr(entries, "close", None)
+        if close is not None:
+            close()
+
+
+def get_mtime(path):
+    """Modification time of a path in nanoseconds, as an int. Python 2 only has the float, with microsecond precision."""
+    st = os.stat(path)
+    mtime = getattr(st, "st_mtime_ns", None)
+    if mtime is None:
+        mtime = int(st.st_mtime * 1000000) * 1000
+    return mtime
+
+
+def get_node_controller(node, controller_type):
+    """The controller of a given type of a Node or a NodeControlGroup, or None"""
+    controllers = getattr(node, "controllers", None)
+    if controllers is not None:
+        return controllers.get(controller_type)
+    if node.controller_type == controller_type:
+        return node.controller
+    return None
+
+
+def collect_values(controllers, keys, workers=None, timeout=None, default=None):
+    """
+    Read the same interfaces of many controllers.
+
+    With workers, the controllers are read in a pool of that many threads and a read that has been running for
+    longer than timeout seconds gets the default values instead. A read cannot be interrupted, so its thread is left
+    to finish in the background. Reads still queued behind such threads are given up on, with the default values,
+    once the sweep has taken as long as it would with every read timing out.
+
+    :param controllers: iterable -> (key, controller) pairs
+    :param keys: list -> Interface names, as in Controller.get_content
+    :param workers: None | int -> Number of threads. Without workers the reads are serial and never time out.
+    :param timeout: None | float -> Seconds a single controller's reads may take
+    :param default: The value of interfaces that are missing, unreadable or timed out
+    :return: dict -> {key: {interface name: value}}
+    """
+    keys = list(keys)
+
+    def read(controller):
+        values = controller.snapshot(keys)
+        return dict((key, values.get(key, default)) for key in keys)
+
+    if not workers:
+        return dict((key, read(controller)) for key, controller in controllers)
+
+    if ThreadPoolExecutor is None:
+        raise RuntimeError("Collecting with workers requires concurrent.futures (the futures package on Python 2)")
+
+    started = {}
+
+    def timed_read(key, controller):
+        started[key] = monotonic()
+        return read(controller)
+
+    results = {}
+    pending = {}
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        submitted = monotonic()
+        for key, controller in controllers:
+            pending[executor.submit(timed_read, key, controller)] = key
+
+        if timeout is not None:
+            # Threads stuck in a read never take the next one, so a queued read may never start
+            rounds = (len(pending) + workers - 1) // workers
+            deadline = submitted + rounds * timeout
+
+        while pending:
+            wait_for = None
+            if timeout is not None:
+                # Wake up when the oldest running read is due, or at the deadline if some have not started yet
+                due = [started[key] + timeout if key in started else deadline for key in pending.values()]
+                wait_for = max(0, min(due) - monotonic())
+
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+
+            if timeout is not None:
+                now = monotonic()
+                for future, key in list(pending.items()):
+                    if key in started:
+                        expired = now - started[key] >= timeout
+                    else:
+                        # A read that starts just as it is cancelled gets its own timeout
+                        expired = now >= deadline and future.cancel()
+                    if expired:
+                        del pending[future]
+                        results[key] = dict.fromkeys(keys, default)
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    return results
 
 
 def split_path_components(path):
@@ -67,3 +244,79 @@ def split_path_components(path):
         return components[1:]
 
     return components
+
+
+class NameIndex(object):
+
+    """
+    Maps names to the objects carrying them. Exact lookups are a dictionary hit, substring lookups use an index of
+    the names' n-grams, so only names sharing every n-gram of the pattern get compared. Matches are always returned
+    in the order they were added.
+    """
+    GRAM_SIZE = 3
+
+    def __init__(self):
+        self._items = {}
+        self._grams = {}
+        self._order = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._order)
+
+    def _name_grams(self, name):
+        return set(name[i:i + self.GRAM_SIZE] for i in range(len(name) - self.GRAM_SIZE + 1))
+
+    def add(self, name, item):
+        items = self._items.get(name)
+        if items is None:
+            items = self._items[name] = []
+            for gram in self._name_grams(name):
+                self._grams.setdefault(gram, set()).add(name)
+        items.append(item)
+        self._order[id(item)] = next(self._counter)
+
+    def remove(self, name, item):
+        items = self._items.get(name, [])
+        for idx, existing in enumerate(items):
+            if existing is item:
+                del items[idx]
+                del self._order[id(item)]
+                break
+        else:
+            return
+
+        if items:
+            return
+
+        del self._items[name]
+        for gram in self._name_grams(name):
+            names = self._grams[gram]
+            names.discard(name)
+            if not names:
+                del self._grams[gram]
+
+    def _sorted(self, items):
+        return sorted(items, key=lambda item: self._order[id(item)])
+
+    def exact(self, name):
+        """All items with exactly this name"""
+        return list(self._items.get(name, []))
+
+    def search(self, pattern):
+        """All items whose name contains the pattern"""
+        if len(pattern) < self.GRAM_SIZE:
+            candidates = self._items.keys()
+        else:
+            candidates = None
+            for gram in self._name_grams(pattern):
+                names = self._grams.get(gram)
+                if not names:
+                    return []
+                candidates = set(names) if candidates is None else candidates & names
+
+        items = []
+        for name in candidates:
+            if pattern in name:
+                items.extend(self._items[name])
+        return self._sorted(items)
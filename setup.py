@@ -14,6 +14,9 @@ setup(
     version=cgroupspy.__version__,
     packages=['cgroupspy'],
     tests_require=['mock', 'nose2'],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     author='CloudSigma AG',
     author_email='dev-support@cloudsigma.com',
     maintainer='Miguel Trujillo',